@@ -51,6 +51,7 @@ def run_migrations_offline() -> None:
         dialect_opts={"paramstyle": "named"},
         compare_type=True,
         compare_server_default=True,
+        transaction_per_migration=True,
     )
 
     with context.begin_transaction():
@@ -70,11 +71,19 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
+        # DDL ждёт блокировку не дольше lock_timeout: ожидающий ACCESS EXCLUSIVE
+        # иначе блокирует все запросы к таблице, пришедшие после него
+        connection.exec_driver_sql(f"SET lock_timeout = {int(settings.MIGRATION_LOCK_TIMEOUT_MS)}")
+        connection.commit()
+
         context.configure(
             connection=connection,
             target_metadata=target_metadata,
             compare_type=True,
             compare_server_default=True,
+            # Каждая миграция - своя транзакция: autocommit_block в онлайн-миграциях
+            # (CREATE INDEX CONCURRENTLY, заполнение пачками) не откатывает предыдущие
+            transaction_per_migration=True,
         )
 
         with context.begin_transaction():
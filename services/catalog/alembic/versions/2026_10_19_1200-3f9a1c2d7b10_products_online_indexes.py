@@ -0,0 +1,33 @@
+"""Индекс товаров: trigram по описанию
+
+Revision ID: 3f9a1c2d7b10
+Revises:
+Create Date: 2026-10-19 12:00:00.000000+03:00
+
+Индекс строится CONCURRENTLY: запись в products во время миграции не блокируется.
+Индексы сортировки витрины - частичные, в 8c41e07d5a92.
+"""
+from typing import Sequence, Union
+
+from app.db.online_migrations import create_index_concurrently, drop_index_concurrently
+
+# revision identifiers, used by Alembic.
+revision: str = "3f9a1c2d7b10"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Поиск ILIKE по описанию (фильтр search)
+    create_index_concurrently(
+        "idx_products_description_trgm",
+        "products",
+        ["description"],
+        postgresql_using="gin",
+        postgresql_ops={"description": "gin_trgm_ops"},
+    )
+
+
+def downgrade() -> None:
+    drop_index_concurrently("idx_products_description_trgm", "products")
@@ -0,0 +1,70 @@
+"""Частичные индексы «горячих» товаров (status <> 'discontinued')
+
+Revision ID: 8c41e07d5a92
+Revises: 3f9a1c2d7b10
+Create Date: 2026-10-19 12:30:00.000000+03:00
+
+Снятые с производства товары остаются в products (на них ссылаются order_items,
+отзывы и избранное), но запросы витрины их отсекают. Индексы сортировки и
+фильтров витрины строятся только по остальным строкам, поэтому их размер и
+обход не растут вместе с архивом. Полный индекс цены (его заменяет частичный)
+и индексы по флагам и статусу на все строки удаляются; карточки по id и slug
+продолжают работать через первичный ключ и уникальный индекс slug.
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from app.db.online_migrations import create_index_concurrently, drop_index_concurrently
+
+# revision identifiers, used by Alembic.
+revision: str = "8c41e07d5a92"
+down_revision: Union[str, None] = "3f9a1c2d7b10"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+HOT = sa.text("status <> 'discontinued'")
+
+
+def upgrade() -> None:
+    create_index_concurrently(
+        "idx_products_hot_created_at", "products", [sa.text("created_at DESC")], postgresql_where=HOT
+    )
+    create_index_concurrently(
+        "idx_products_hot_category_created_at", "products",
+        ["category_id", sa.text("created_at DESC")], postgresql_where=HOT,
+    )
+    create_index_concurrently(
+        "idx_products_hot_category_price", "products", ["category_id", "price"], postgresql_where=HOT
+    )
+    create_index_concurrently("idx_products_hot_price", "products", ["price"], postgresql_where=HOT)
+    # get_featured / get_new
+    create_index_concurrently(
+        "idx_products_hot_featured", "products", ["id"],
+        postgresql_where=sa.text("is_featured AND status <> 'discontinued'"),
+    )
+    create_index_concurrently(
+        "idx_products_hot_new", "products", [sa.text("created_at DESC")],
+        postgresql_where=sa.text("is_new AND status <> 'discontinued'"),
+    )
+
+    # Заменён idx_products_hot_price; по цене среди снятых с производства витрина не ищет
+    drop_index_concurrently("idx_products_price", "products")
+    # Индексы по флагам и статусу на всю таблицу почти не отсекают строк
+    drop_index_concurrently("idx_products_featured", "products")
+    drop_index_concurrently("idx_products_new", "products")
+    drop_index_concurrently("idx_products_status", "products")
+
+
+def downgrade() -> None:
+    create_index_concurrently("idx_products_status", "products", ["status"])
+    create_index_concurrently("idx_products_new", "products", ["is_new"])
+    create_index_concurrently("idx_products_featured", "products", ["is_featured"])
+    create_index_concurrently("idx_products_price", "products", ["price"])
+
+    drop_index_concurrently("idx_products_hot_new", "products")
+    drop_index_concurrently("idx_products_hot_featured", "products")
+    drop_index_concurrently("idx_products_hot_price", "products")
+    drop_index_concurrently("idx_products_hot_category_price", "products")
+    drop_index_concurrently("idx_products_hot_category_created_at", "products")
+    drop_index_concurrently("idx_products_hot_created_at", "products")
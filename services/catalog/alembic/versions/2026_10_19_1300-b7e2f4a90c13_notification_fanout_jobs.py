@@ -0,0 +1,93 @@
+"""Задания рассылки уведомлений о поступлении и снижении цены
+
+Revision ID: b7e2f4a90c13
+Revises: 8c41e07d5a92
+Create Date: 2026-10-19 13:00:00.000000+03:00
+
+Триггер на products в той же транзакции, что и изменение товара, ставит задание,
+если остаток вырос с нуля или цена снизилась ниже старой. Рассылку по избранному
+выполняет фоновый воркер каталога (app/core/notification_fanout.py).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from app.db.online_migrations import create_index_concurrently, drop_index_concurrently
+
+# revision identifiers, used by Alembic.
+revision: str = "b7e2f4a90c13"
+down_revision: Union[str, None] = "8c41e07d5a92"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "notification_fanout_jobs",
+        sa.Column("id", sa.BigInteger(), primary_key=True),
+        sa.Column(
+            "product_id", postgresql.UUID(as_uuid=True),
+            sa.ForeignKey("products.id", ondelete="CASCADE"), nullable=False,
+        ),
+        sa.Column("kind", sa.String(20), nullable=False),
+        sa.Column("data", postgresql.JSONB(), nullable=False),
+        sa.Column("cursor", postgresql.UUID(as_uuid=True)),
+        sa.Column("notified", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("locked_until", sa.DateTime(timezone=True)),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("finished_at", sa.DateTime(timezone=True)),
+    )
+    op.create_index(
+        "idx_notification_fanout_jobs_pending", "notification_fanout_jobs", ["id"],
+        postgresql_where=sa.text("finished_at IS NULL"),
+    )
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION enqueue_notification_fanout()
+        RETURNS TRIGGER AS $$
+        DECLARE
+            job_data JSONB;
+        BEGIN
+            job_data := jsonb_build_object(
+                'name', NEW.name,
+                'slug', NEW.slug,
+                'price', NEW.price::text,
+                'old_price', NEW.old_price::text,
+                'previous_price', OLD.price::text
+            );
+
+            IF COALESCE(OLD.stock_quantity, 0) = 0 AND NEW.stock_quantity > 0
+                AND NEW.status <> 'discontinued' THEN
+                INSERT INTO notification_fanout_jobs (product_id, kind, data)
+                VALUES (NEW.id, 'back_in_stock', job_data);
+            END IF;
+
+            IF NEW.price < OLD.price AND NEW.old_price IS NOT NULL AND NEW.price < NEW.old_price THEN
+                INSERT INTO notification_fanout_jobs (product_id, kind, data)
+                VALUES (NEW.id, 'price_drop', job_data);
+            END IF;
+
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER enqueue_products_notification_fanout AFTER UPDATE OF stock_quantity, price ON products
+            FOR EACH ROW EXECUTE FUNCTION enqueue_notification_fanout()
+    """)
+
+    # Постраничный обход избранного товара по user_id
+    create_index_concurrently("idx_favorites_product_user", "favorites", ["product_id", "user_id"])
+    drop_index_concurrently("idx_favorites_product", "favorites")
+
+
+def downgrade() -> None:
+    create_index_concurrently("idx_favorites_product", "favorites", ["product_id"])
+    drop_index_concurrently("idx_favorites_product_user", "favorites")
+
+    op.execute("DROP TRIGGER IF EXISTS enqueue_products_notification_fanout ON products")
+    op.execute("DROP FUNCTION IF EXISTS enqueue_notification_fanout()")
+    op.drop_table("notification_fanout_jobs")
@@ -0,0 +1,78 @@
+"""История slug товаров и категорий
+
+Revision ID: d41a6e9c2f58
+Revises: b7e2f4a90c13
+Create Date: 2026-10-19 13:30:00.000000+03:00
+
+Триггер при смене slug сохраняет прежний в slug_history, поэтому старые ссылки
+отвечают 301 на текущий адрес. Карта slug в памяти воркера
+(app/indexes/slugs.py) загружает историю при прогреве.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "d41a6e9c2f58"
+down_revision: Union[str, None] = "b7e2f4a90c13"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "slug_history",
+        sa.Column("entity", sa.String(20), primary_key=True),
+        sa.Column("slug", sa.String(255), primary_key=True),
+        sa.Column("entity_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("changed_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("idx_slug_history_entity_id", "slug_history", ["entity_id"])
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION record_slug_history()
+        RETURNS TRIGGER AS $$
+        DECLARE
+            entity_name VARCHAR(20);
+        BEGIN
+            IF TG_TABLE_NAME = 'products' THEN
+                entity_name := 'product';
+            ELSE
+                entity_name := 'category';
+            END IF;
+
+            IF TG_OP = 'DELETE' THEN
+                DELETE FROM slug_history WHERE entity = entity_name AND entity_id = OLD.id;
+                RETURN NULL;
+            END IF;
+
+            -- slug снова занят живой записью: перенаправление по нему больше не действует
+            DELETE FROM slug_history WHERE entity = entity_name AND slug = NEW.slug;
+            INSERT INTO slug_history (entity, slug, entity_id)
+            VALUES (entity_name, OLD.slug, NEW.id)
+            ON CONFLICT (entity, slug) DO UPDATE
+                SET entity_id = EXCLUDED.entity_id, changed_at = now();
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    for table in ("products", "categories"):
+        op.execute(f"""
+            CREATE TRIGGER record_{table}_slug_history AFTER UPDATE OF slug ON {table}
+                FOR EACH ROW WHEN (OLD.slug IS DISTINCT FROM NEW.slug)
+                EXECUTE FUNCTION record_slug_history()
+        """)
+        op.execute(f"""
+            CREATE TRIGGER clear_{table}_slug_history AFTER DELETE ON {table}
+                FOR EACH ROW EXECUTE FUNCTION record_slug_history()
+        """)
+
+
+def downgrade() -> None:
+    for table in ("products", "categories"):
+        op.execute(f"DROP TRIGGER IF EXISTS clear_{table}_slug_history ON {table}")
+        op.execute(f"DROP TRIGGER IF EXISTS record_{table}_slug_history ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS record_slug_history()")
+    op.drop_table("slug_history")
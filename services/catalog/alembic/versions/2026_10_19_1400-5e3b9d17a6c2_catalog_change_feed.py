@@ -0,0 +1,106 @@
+"""Лента изменений каталога
+
+Revision ID: 5e3b9d17a6c2
+Revises: d41a6e9c2f58
+Create Date: 2026-10-19 14:00:00.000000+03:00
+
+Каждое изменение товара или категории триггер publish_catalog_change()
+записывает в catalog_changes с seq и рассылает через NOTIFY catalog_changes
+(app/core/change_feed.py). Таблица и триггеры создаются с IF NOT EXISTS /
+CREATE OR REPLACE: в базах, созданных прежним init-db.sql, они уже есть.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5e3b9d17a6c2"
+down_revision: Union[str, None] = "d41a6e9c2f58"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS catalog_changes (
+            seq BIGSERIAL PRIMARY KEY,
+            entity VARCHAR(20) NOT NULL,
+            op VARCHAR(10) NOT NULL,
+            entity_id UUID NOT NULL,
+            data JSONB,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS idx_catalog_changes_created ON catalog_changes(created_at)")
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION publish_catalog_change()
+        RETURNS TRIGGER AS $$
+        DECLARE
+            rec RECORD;
+            entity_name VARCHAR(20);
+            change_data JSONB;
+            change_seq BIGINT;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                rec := OLD;
+            ELSE
+                rec := NEW;
+            END IF;
+
+            -- Счётчик просмотров меняется на каждый показ товара и не интересен подписчикам
+            IF TG_OP = 'UPDATE'
+                AND (to_jsonb(OLD) - 'view_count' - 'updated_at') = (to_jsonb(NEW) - 'view_count' - 'updated_at') THEN
+                RETURN NULL;
+            END IF;
+
+            IF TG_TABLE_NAME = 'products' THEN
+                entity_name := 'product';
+                change_data := jsonb_build_object(
+                    'slug', rec.slug,
+                    'name', rec.name,
+                    'category_id', rec.category_id,
+                    'price', rec.price,
+                    'old_price', rec.old_price,
+                    'status', rec.status,
+                    'stock_quantity', rec.stock_quantity
+                );
+            ELSE
+                entity_name := 'category';
+                change_data := jsonb_build_object(
+                    'slug', rec.slug,
+                    'name', rec.name,
+                    'parent_id', rec.parent_id,
+                    'is_active', rec.is_active
+                );
+            END IF;
+
+            INSERT INTO catalog_changes (entity, op, entity_id, data)
+            VALUES (entity_name, lower(TG_OP), rec.id, change_data)
+            RETURNING seq INTO change_seq;
+
+            PERFORM pg_notify('catalog_changes', jsonb_build_object(
+                'seq', change_seq,
+                'entity', entity_name,
+                'op', lower(TG_OP),
+                'id', rec.id,
+                'data', change_data
+            )::text);
+
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    for table in ("products", "categories"):
+        op.execute(f"DROP TRIGGER IF EXISTS publish_{table}_change ON {table}")
+        op.execute(f"""
+            CREATE TRIGGER publish_{table}_change AFTER INSERT OR UPDATE OR DELETE ON {table}
+                FOR EACH ROW EXECUTE FUNCTION publish_catalog_change()
+        """)
+
+
+def downgrade() -> None:
+    for table in ("products", "categories"):
+        op.execute(f"DROP TRIGGER IF EXISTS publish_{table}_change ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS publish_catalog_change()")
+    op.execute("DROP TABLE IF EXISTS catalog_changes")
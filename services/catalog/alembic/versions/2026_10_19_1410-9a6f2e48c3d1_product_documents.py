@@ -0,0 +1,164 @@
+"""Документы товаров (read model)
+
+Revision ID: 9a6f2e48c3d1
+Revises: 5e3b9d17a6c2
+Create Date: 2026-10-19 14:10:00.000000+03:00
+
+product_documents хранит готовый JSON карточки товара в форме ProductResponse
+с изображениями и категорией. Документ пересобирается триггерами в той же
+транзакции, что и изменение товара, его изображений или категории; view_count
+и updated_at подставляются при чтении из products. Объекты создаются с
+IF NOT EXISTS / CREATE OR REPLACE (в базах, созданных прежним init-db.sql, они
+уже есть), документы существующих товаров заполняются пачками.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from app.db.online_migrations import call_in_batches
+
+# revision identifiers, used by Alembic.
+revision: str = "9a6f2e48c3d1"
+down_revision: Union[str, None] = "5e3b9d17a6c2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TRIGGERS = (
+    ("sync_products_document", "products", "AFTER INSERT OR UPDATE"),
+    ("sync_product_images_document", "product_images", "AFTER INSERT OR UPDATE OR DELETE"),
+    # Удаление категории обнуляет products.category_id и пересобирает документы через триггер товаров
+    ("sync_categories_document", "categories", "AFTER UPDATE"),
+)
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS product_documents (
+            product_id UUID PRIMARY KEY REFERENCES products(id) ON DELETE CASCADE,
+            document JSONB NOT NULL,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Время в том же виде, что и в ответах API (ISO 8601, UTC)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION api_timestamp(ts TIMESTAMP WITH TIME ZONE)
+        RETURNS TEXT AS $$
+            SELECT to_char(ts AT TIME ZONE 'UTC', 'YYYY-MM-DD"T"HH24:MI:SS.US"Z"');
+        $$ LANGUAGE sql IMMUTABLE
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION refresh_product_document(p_id UUID)
+        RETURNS VOID AS $$
+        BEGIN
+            -- Decimal в ответах API сериализуется строкой
+            INSERT INTO product_documents (product_id, document, updated_at)
+            SELECT p.id, jsonb_build_object(
+                'id', p.id,
+                'category_id', p.category_id,
+                'name', p.name,
+                'slug', p.slug,
+                'description', p.description,
+                'price', p.price::text,
+                'old_price', p.old_price::text,
+                'status', p.status,
+                'blade_length', p.blade_length::text,
+                'blade_material', p.blade_material,
+                'handle_material', p.handle_material,
+                'weight', p.weight::text,
+                'hardness_hrc', p.hardness_hrc,
+                'purpose', p.purpose,
+                'stock_quantity', p.stock_quantity,
+                'min_order_quantity', p.min_order_quantity,
+                'max_order_quantity', p.max_order_quantity,
+                'is_featured', p.is_featured,
+                'is_new', p.is_new,
+                'view_count', p.view_count,
+                'rating', p.rating::text,
+                'review_count', p.review_count,
+                'meta_title', p.meta_title,
+                'meta_description', p.meta_description,
+                'meta_keywords', p.meta_keywords,
+                'created_at', api_timestamp(p.created_at),
+                'updated_at', api_timestamp(p.updated_at),
+                'images', COALESCE((
+                    SELECT jsonb_agg(jsonb_build_object(
+                        'id', i.id,
+                        'product_id', i.product_id,
+                        'image_url', i.image_url,
+                        'alt_text', i.alt_text,
+                        'is_main', i.is_main,
+                        'sort_order', i.sort_order,
+                        'created_at', api_timestamp(i.created_at)
+                    ) ORDER BY i.sort_order, i.created_at)
+                    FROM product_images i
+                    WHERE i.product_id = p.id
+                ), '[]'::jsonb),
+                'category', (
+                    SELECT jsonb_build_object(
+                        'id', c.id,
+                        'parent_id', c.parent_id,
+                        'name', c.name,
+                        'slug', c.slug,
+                        'description', c.description,
+                        'image_url', c.image_url,
+                        'is_active', c.is_active,
+                        'sort_order', c.sort_order,
+                        'created_at', api_timestamp(c.created_at),
+                        'updated_at', api_timestamp(c.updated_at),
+                        'product_count', 0
+                    )
+                    FROM categories c
+                    WHERE c.id = p.category_id
+                )
+            ), CURRENT_TIMESTAMP
+            FROM products p
+            WHERE p.id = p_id
+            ON CONFLICT (product_id) DO UPDATE
+                SET document = EXCLUDED.document, updated_at = EXCLUDED.updated_at;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION sync_product_document()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_TABLE_NAME = 'products' THEN
+                -- Изменение только счётчика просмотров документ не пересобирает
+                IF TG_OP = 'UPDATE'
+                    AND (to_jsonb(OLD) - 'view_count' - 'updated_at') = (to_jsonb(NEW) - 'view_count' - 'updated_at') THEN
+                    RETURN NULL;
+                END IF;
+                PERFORM refresh_product_document(NEW.id);
+            ELSIF TG_TABLE_NAME = 'product_images' THEN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    PERFORM refresh_product_document(OLD.product_id);
+                END IF;
+                IF TG_OP = 'INSERT' THEN
+                    PERFORM refresh_product_document(NEW.product_id);
+                ELSIF TG_OP = 'UPDATE' AND NEW.product_id IS DISTINCT FROM OLD.product_id THEN
+                    PERFORM refresh_product_document(NEW.product_id);
+                END IF;
+            ELSE
+                -- Категория: пересобрать документы всех её товаров
+                PERFORM refresh_product_document(p.id) FROM products p WHERE p.category_id = NEW.id;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    for name, table, events in TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+        op.execute(f"CREATE TRIGGER {name} {events} ON {table} FOR EACH ROW EXECUTE FUNCTION sync_product_document()")
+
+    # Документы уже существующих товаров
+    call_in_batches("products", "refresh_product_document")
+
+
+def downgrade() -> None:
+    for name, table, _ in TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS sync_product_document()")
+    op.execute("DROP FUNCTION IF EXISTS refresh_product_document(UUID)")
+    op.execute("DROP FUNCTION IF EXISTS api_timestamp(TIMESTAMP WITH TIME ZONE)")
+    op.execute("DROP TABLE IF EXISTS product_documents")
@@ -0,0 +1,51 @@
+"""updated_at товара не меняется от просмотров
+
+Revision ID: c6d82a1f4e07
+Revises: 9a6f2e48c3d1
+Create Date: 2026-10-19 14:20:00.000000+03:00
+
+updated_at товара служит токеном версии при оформлении заказа
+(/products/validate-cart). Общий триггер update_updated_at_column() сдвигал его
+на каждое увеличение view_count, и оформление конфликтовало из-за одних
+просмотров. Для products триггер заменяется на update_product_updated_at(),
+который оставляет прежнее значение, если изменился только view_count.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c6d82a1f4e07"
+down_revision: Union[str, None] = "9a6f2e48c3d1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE OR REPLACE FUNCTION update_product_updated_at()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF (to_jsonb(OLD) - 'view_count' - 'updated_at') = (to_jsonb(NEW) - 'view_count' - 'updated_at') THEN
+                NEW.updated_at = OLD.updated_at;
+            ELSE
+                NEW.updated_at = CURRENT_TIMESTAMP;
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("DROP TRIGGER IF EXISTS update_products_updated_at ON products")
+    op.execute("""
+        CREATE TRIGGER update_products_updated_at BEFORE UPDATE ON products
+            FOR EACH ROW EXECUTE FUNCTION update_product_updated_at()
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS update_products_updated_at ON products")
+    op.execute("""
+        CREATE TRIGGER update_products_updated_at BEFORE UPDATE ON products
+            FOR EACH ROW EXECUTE FUNCTION update_updated_at_column()
+    """)
+    op.execute("DROP FUNCTION IF EXISTS update_product_updated_at()")
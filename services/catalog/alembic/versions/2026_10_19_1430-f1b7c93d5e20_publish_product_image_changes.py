@@ -0,0 +1,107 @@
+"""Изменения изображений товара в ленте изменений
+
+Revision ID: f1b7c93d5e20
+Revises: c6d82a1f4e07
+Create Date: 2026-10-19 14:30:00.000000+03:00
+
+Изображения входят в карточку товара, но product_images не публиковала событий,
+и кэш карточек в воркерах держал прежние изображения до истечения TTL.
+Триггер на product_images публикует через publish_catalog_change() событие
+update товара с его текущими данными.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f1b7c93d5e20"
+down_revision: Union[str, None] = "c6d82a1f4e07"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Ветка для product_images; без неё функция равносильна ревизии 5e3b9d17a6c2
+IMAGES_BRANCH = """
+            IF TG_TABLE_NAME = 'product_images' THEN
+                SELECT * INTO rec FROM products WHERE id = rec.product_id;
+                IF NOT FOUND THEN
+                    -- Товар удалён вместе с изображениями: событие delete уже опубликовано
+                    RETURN NULL;
+                END IF;
+                change_op := 'update';
+            END IF;
+"""
+
+PUBLISH_FUNCTION = """
+        CREATE OR REPLACE FUNCTION publish_catalog_change()
+        RETURNS TRIGGER AS $$
+        DECLARE
+            rec RECORD;
+            entity_name VARCHAR(20);
+            change_op VARCHAR(10);
+            change_data JSONB;
+            change_seq BIGINT;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                rec := OLD;
+            ELSE
+                rec := NEW;
+            END IF;
+            change_op := lower(TG_OP);
+
+            -- Счётчик просмотров меняется на каждый показ товара и не интересен подписчикам
+            IF TG_TABLE_NAME <> 'product_images' AND TG_OP = 'UPDATE'
+                AND (to_jsonb(OLD) - 'view_count' - 'updated_at') = (to_jsonb(NEW) - 'view_count' - 'updated_at') THEN
+                RETURN NULL;
+            END IF;
+{images}
+            IF TG_TABLE_NAME = 'categories' THEN
+                entity_name := 'category';
+                change_data := jsonb_build_object(
+                    'slug', rec.slug,
+                    'name', rec.name,
+                    'parent_id', rec.parent_id,
+                    'is_active', rec.is_active
+                );
+            ELSE
+                entity_name := 'product';
+                change_data := jsonb_build_object(
+                    'slug', rec.slug,
+                    'name', rec.name,
+                    'category_id', rec.category_id,
+                    'price', rec.price,
+                    'old_price', rec.old_price,
+                    'status', rec.status,
+                    'stock_quantity', rec.stock_quantity
+                );
+            END IF;
+
+            INSERT INTO catalog_changes (entity, op, entity_id, data)
+            VALUES (entity_name, change_op, rec.id, change_data)
+            RETURNING seq INTO change_seq;
+
+            PERFORM pg_notify('catalog_changes', jsonb_build_object(
+                'seq', change_seq,
+                'entity', entity_name,
+                'op', change_op,
+                'id', rec.id,
+                'data', change_data
+            )::text);
+
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+"""
+
+
+def upgrade() -> None:
+    op.execute(PUBLISH_FUNCTION.format(images=IMAGES_BRANCH))
+    op.execute("DROP TRIGGER IF EXISTS publish_product_images_change ON product_images")
+    op.execute("""
+        CREATE TRIGGER publish_product_images_change AFTER INSERT OR UPDATE OR DELETE ON product_images
+            FOR EACH ROW EXECUTE FUNCTION publish_catalog_change()
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS publish_product_images_change ON product_images")
+    op.execute(PUBLISH_FUNCTION.format(images=""))
@@ -0,0 +1,13 @@
+"""
+API v1
+"""
+from fastapi import APIRouter
+
+from app.api.v1 import products, categories, changes, search, admin
+
+api_router = APIRouter()
+api_router.include_router(products.router)
+api_router.include_router(categories.router)
+api_router.include_router(changes.router)
+api_router.include_router(search.router)
+api_router.include_router(admin.router)
@@ -0,0 +1,49 @@
+"""
+Служебные API endpoints для администраторов
+
+Доступны только с заголовком X-Admin-Token, равным ADMIN_API_TOKEN.
+Пока токен не задан, endpoints отвечают 404.
+"""
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+
+from app.core.config import settings
+from app.core.slow_queries import slow_query_recorder
+
+
+async def require_admin_token(x_admin_token: Optional[str] = Header(None)) -> None:
+    """Проверка токена администратора"""
+    if not settings.ADMIN_API_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if x_admin_token is None or not secrets.compare_digest(
+        x_admin_token.encode(), settings.ADMIN_API_TOKEN.encode()
+    ):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Неверный токен администратора")
+
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin_token)])
+
+
+@router.get("/slow-queries", response_model=list[dict])
+async def get_slow_queries(
+    limit: int = Query(50, ge=1, le=1000, description="Количество записей"),
+):
+    """
+    Медленные запросы всех воркеров, от новых к старым
+
+    Каждая запись содержит нормализованный SQL, длительность, фильтры ProductFilter,
+    с которыми был построен запрос, и план EXPLAIN (ANALYZE, BUFFERS) для выборочных
+    SELECT-запросов.
+    """
+    return await slow_query_recorder.records(limit)
+
+
+@router.delete("/slow-queries", status_code=status.HTTP_204_NO_CONTENT)
+async def clear_slow_queries():
+    """
+    Очистить буфер медленных запросов
+    """
+    await slow_query_recorder.clear()
+    return None
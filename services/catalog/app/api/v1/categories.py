@@ -1,7 +1,9 @@
 """
 API endpoints для работы с категориями
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi.responses import RedirectResponse
+from pydantic import TypeAdapter
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from uuid import UUID
@@ -9,12 +11,32 @@ from uuid import UUID
 from app.db.database import get_db
 from app.schemas.product import CategoryResponse
 from app.crud.product import CategoryCRUD
+from app.core.cache import CachedBody, response_cache, cached_json_response
+from app.core.metrics import serialization_timer
+from app.indexes.slugs import slug_index
 
 router = APIRouter(prefix="/categories", tags=["categories"])
 
+category_list_adapter = TypeAdapter(list[CategoryResponse])
+
+
+async def load_categories_payload(db: AsyncSession, is_active: Optional[bool]) -> CachedBody:
+    """Сериализованный список категорий (из кэша или из БД)"""
+    key = f"categories:{is_active}"
+    entry = response_cache.get(key)
+    if entry is None:
+        categories = await CategoryCRUD.get_all(db, is_active)
+        with serialization_timer("CategoryResponse[]"):
+            body = category_list_adapter.dump_json(
+                category_list_adapter.validate_python(categories, from_attributes=True)
+            )
+        entry = response_cache.set(key, body)
+    return entry
+
 
 @router.get("/", response_model=list[CategoryResponse])
 async def get_categories(
+    request: Request,
     is_active: Optional[bool] = Query(None, description="Фильтр по активности"),
     db: AsyncSession = Depends(get_db)
 ):
@@ -23,8 +45,7 @@ async def get_categories(
     
     - **is_active**: Фильтровать только активные категории
     """
-    categories = await CategoryCRUD.get_all(db, is_active)
-    return categories
+    return cached_json_response(request, await load_categories_payload(db, is_active))
 
 
 @router.get("/with-count", response_model=list[dict])
@@ -74,11 +95,31 @@ async def get_category(
 
 @router.get("/slug/{slug}", response_model=CategoryResponse)
 async def get_category_by_slug(
+    request: Request,
     slug: str,
     db: AsyncSession = Depends(get_db)
 ):
-    """Получить категорию по slug"""
-    category = await CategoryCRUD.get_by_slug(db, slug)
+    """
+    Получить категорию по slug
+
+    Прежний slug переименованной категории отвечает 301 на текущий адрес.
+    """
+    category_id = slug_index.categories.resolve(slug)
+    if category_id is not None:
+        category = await CategoryCRUD.get_by_id(db, category_id)
+    else:
+        current = slug_index.categories.redirect(slug)
+        if current is None:
+            # Карта ещё не получила событие о категории (или не загружена)
+            category = await CategoryCRUD.get_by_slug(db, slug)
+            if not category:
+                current = await CategoryCRUD.get_current_slug(db, slug)
+        if current is not None:
+            return RedirectResponse(
+                request.url_for("get_category_by_slug", slug=current),
+                status_code=status.HTTP_301_MOVED_PERMANENTLY,
+            )
+
     if not category:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -0,0 +1,99 @@
+"""
+API endpoints ленты изменений каталога (Server-Sent Events)
+"""
+import asyncio
+import json
+from typing import Optional
+
+from fastapi import APIRouter, Header, Query, Request
+from fastapi.responses import StreamingResponse
+
+from app.core.config import settings
+from app.core.change_feed import RESYNC_EVENT, DeliveredSeqs, change_feed, replay, is_retained
+
+router = APIRouter(prefix="/changes", tags=["changes"])
+
+
+def format_event(event: dict) -> str:
+    """Событие в формате SSE; id равен seq для возобновления через Last-Event-ID"""
+    lines = []
+    if event["seq"] is not None:
+        lines.append(f"id: {event['seq']}")
+    lines.append(f"event: {event['entity']}")
+    lines.append(f"data: {json.dumps(event, ensure_ascii=False, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+@router.get("/stream")
+async def stream_changes(
+    request: Request,
+    since: Optional[int] = Query(None, ge=0, description="Продолжить после указанного seq"),
+    last_event_id: Optional[int] = Header(None, description="Стандартный заголовок возобновления SSE"),
+):
+    """
+    Поток изменений товаров и категорий (text/event-stream)
+
+    Каждое событие содержит seq, entity (product/category), op (insert/update/delete),
+    id и компактный набор полей. Клиент возобновляет поток с последнего полученного
+    seq через заголовок Last-Event-ID или параметр **since**. seq выдаётся при записи,
+    а не при фиксации транзакции, поэтому события разных записей могут приходить не
+    по возрастанию seq, а при возобновлении последние события могут повториться -
+    их нужно применять идемпотентно. Если события уже удалены из истории, приходит
+    событие `resync` - клиенту нужно перечитать каталог целиком.
+    """
+    after_seq = last_event_id if last_event_id is not None else since
+
+    async def events():
+        # Подписываемся до чтения истории, чтобы не потерять события между ними
+        subscription = change_feed.subscribe()
+        delivered = DeliveredSeqs(settings.CHANGE_FEED_REORDER_WINDOW, after_seq)
+        try:
+            if after_seq is not None and not await is_retained(after_seq):
+                yield format_event(RESYNC_EVENT)
+                delivered = DeliveredSeqs(settings.CHANGE_FEED_REORDER_WINDOW)
+
+            catching_up = delivered.high is not None
+            while True:
+                if subscription.lagging and subscription.queue.empty():
+                    # Клиент не успевал читать или уведомления терялись при обрыве
+                    # LISTEN: пропущенное дочитываем из таблицы
+                    subscription.reset()
+                    catching_up = True
+                    if delivered.high is None:
+                        # Позиция клиента неизвестна - продолжить нечем
+                        yield format_event(RESYNC_EVENT)
+                        catching_up = False
+
+                if catching_up:
+                    async for event in replay(delivered.replay_from()):
+                        if delivered.add(event["seq"]):
+                            yield format_event(event)
+                    catching_up = False
+
+                try:
+                    event = await asyncio.wait_for(
+                        subscription.queue.get(), settings.CHANGE_FEED_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keepalive\n\n"
+                    continue
+
+                # resync в очереди подписки только будит поток: дочитывание по lagging
+                if event["op"] == "resync" or not delivered.add(event["seq"]):
+                    continue
+                yield format_event(event)
+        finally:
+            change_feed.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            # Поток не должен буферизоваться GZipMiddleware
+            "Content-Encoding": "identity",
+        },
+    )
@@ -1,10 +1,13 @@
 """
 API endpoints для работы с товарами
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi.responses import RedirectResponse, Response
+from pydantic import TypeAdapter
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from uuid import UUID
+from decimal import Decimal
 import math
 
 from app.db.database import get_db
@@ -13,12 +16,71 @@ from app.schemas.product import (
     ProductCreate,
     ProductUpdate,
     ProductListResponse,
-    ProductFilter
+    ProductFilter,
+    ProductBatchRequest
 )
+from app.schemas.cart import CartValidationRequest, CartValidationResponse, CartLineVerdict
 from app.crud.product import ProductCRUD
+from app.db.models import ProductStatus
+from app.core.config import settings
+from app.core.cache import CachedBody, response_cache, cached_json_response
+from app.core.metrics import serialization_timer
+from app.indexes.similar import similar_index
+from app.indexes.slugs import slug_index
 
 router = APIRouter(prefix="/products", tags=["products"])
 
+product_list_adapter = TypeAdapter(list[ProductResponse])
+
+# Тексты кодов ошибок позиции корзины из ProductCRUD.validate_cart
+CART_ERROR_MESSAGES = {
+    "not_found": "Товар не найден",
+    "discontinued": "Товар снят с производства",
+    "below_min_quantity": "Минимальное количество для заказа: {min_order_quantity}",
+    "above_max_quantity": "Максимальное количество для заказа: {max_order_quantity}",
+    "insufficient_stock": "Недостаточно товара на складе, доступно: {available_quantity}",
+}
+
+
+async def load_product_payload(db: AsyncSession, product_id: UUID) -> Optional[CachedBody]:
+    """Сериализованная карточка товара (из кэша или из read model); None - товара нет"""
+    key = f"product:{product_id}"
+    entry = response_cache.get(key)
+    if entry is None:
+        document = await ProductCRUD.get_document(db, product_id)
+        if document is None:
+            return None
+        entry = response_cache.set(key, document.encode())
+    return entry
+
+
+async def load_featured_payload(db: AsyncSession, limit: int) -> CachedBody:
+    """Сериализованный список избранных товаров (из кэша или из БД)"""
+    key = f"featured:{limit}"
+    entry = response_cache.get(key)
+    if entry is None:
+        products = await ProductCRUD.get_featured(db, limit)
+        with serialization_timer("ProductResponse[]"):
+            body = product_list_adapter.dump_json(
+                product_list_adapter.validate_python(products, from_attributes=True)
+            )
+        entry = response_cache.set(key, body)
+    return entry
+
+
+async def load_new_payload(db: AsyncSession, limit: int) -> CachedBody:
+    """Сериализованный список новинок (из кэша или из БД)"""
+    key = f"new:{limit}"
+    entry = response_cache.get(key)
+    if entry is None:
+        products = await ProductCRUD.get_new(db, limit)
+        with serialization_timer("ProductResponse[]"):
+            body = product_list_adapter.dump_json(
+                product_list_adapter.validate_python(products, from_attributes=True)
+            )
+        entry = response_cache.set(key, body)
+    return entry
+
 
 @router.get("/", response_model=ProductListResponse)
 async def get_products(
@@ -86,43 +148,120 @@ async def get_products(
     products, total = await ProductCRUD.get_list(db, filters)
     total_pages = math.ceil(total / page_size)
     
-    return ProductListResponse(
-        items=products,
-        total=total,
-        page=page,
-        page_size=page_size,
-        total_pages=total_pages
-    )
+    # Сериализуем сами: ответ не проходит повторную валидацию response_model
+    with serialization_timer("ProductListResponse"):
+        body = ProductListResponse(
+            items=products,
+            total=total,
+            page=page,
+            page_size=page_size,
+            total_pages=total_pages
+        ).model_dump_json()
+    return Response(content=body, media_type="application/json")
 
 
 @router.get("/featured", response_model=list[ProductResponse])
 async def get_featured_products(
+    request: Request,
     limit: int = Query(10, ge=1, le=50, description="Количество товаров"),
     db: AsyncSession = Depends(get_db)
 ):
     """Получить избранные товары"""
-    products = await ProductCRUD.get_featured(db, limit)
-    return products
+    return cached_json_response(request, await load_featured_payload(db, limit))
 
 
 @router.get("/new", response_model=list[ProductResponse])
 async def get_new_products(
+    request: Request,
     limit: int = Query(10, ge=1, le=50, description="Количество товаров"),
     db: AsyncSession = Depends(get_db)
 ):
     """Получить новинки"""
-    products = await ProductCRUD.get_new(db, limit)
-    return products
+    return cached_json_response(request, await load_new_payload(db, limit))
+
+
+@router.post("/validate-cart", response_model=CartValidationResponse)
+async def validate_cart(
+    cart: CartValidationRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Проверить корзину перед оформлением заказа
+
+    Для каждой позиции проверяется наличие товара, статус, ограничения
+    min/max количества и остаток на складе; возвращаются текущая цена,
+    скидка относительно старой цены, признак товара под заказ и версия
+    товара (updated_at) для оптимистичной проверки при оформлении.
+    Итоги считаются только по допустимым позициям.
+    """
+    rows = await ProductCRUD.validate_cart(db, cart.items)
+
+    verdicts = []
+    total = discount = Decimal("0")
+    for row in rows:
+        limits = {
+            "min_order_quantity": row.min_order_quantity or 1,
+            "max_order_quantity": row.max_order_quantity,
+            "available_quantity": row.stock_quantity or 0,
+        }
+        errors = [CART_ERROR_MESSAGES[code].format(**limits) for code in row.errors]
+
+        is_custom_order = row.status == ProductStatus.ON_ORDER
+        verdicts.append(CartLineVerdict(
+            line=row.line_no,
+            product_id=row.product_id,
+            quantity=row.quantity,
+            is_valid=row.is_valid,
+            errors=errors,
+            error_codes=row.errors,
+            name=row.name,
+            slug=row.slug,
+            status=row.status,
+            unit_price=row.price,
+            old_price=row.old_price,
+            line_total=row.line_total or Decimal("0"),
+            line_discount=row.line_discount or Decimal("0"),
+            available_quantity=row.stock_quantity,
+            is_custom_order=is_custom_order,
+            estimated_delivery_days=settings.ON_ORDER_DELIVERY_DAYS if is_custom_order else None,
+            version=row.updated_at,
+        ))
+        # Оконные суммы одинаковы во всех строках
+        total, discount = row.total, row.discount
+
+    subtotal = total + discount
+    return CartValidationResponse(
+        items=verdicts,
+        is_valid=all(verdict.is_valid for verdict in verdicts),
+        subtotal=subtotal,
+        discount=discount,
+        total=total,
+    )
+
+
+@router.post("/batch", response_model=list[ProductResponse])
+async def get_products_batch(
+    batch: ProductBatchRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Получить несколько товаров по ID
+
+    Карточки возвращаются в порядке запроса готовым JSON из read model
+    одним запросом к БД; несуществующие ID пропускаются.
+    """
+    return Response(content=await ProductCRUD.get_documents(db, batch.ids), media_type="application/json")
 
 
 @router.get("/{product_id}", response_model=ProductResponse)
 async def get_product(
+    request: Request,
     product_id: UUID,
     db: AsyncSession = Depends(get_db)
 ):
     """Получить товар по ID"""
-    product = await ProductCRUD.get_by_id(db, product_id)
-    if not product:
+    entry = await load_product_payload(db, product_id)
+    if entry is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Товар не найден"
@@ -131,26 +270,89 @@ async def get_product(
     # Увеличиваем счётчик просмотров
     await ProductCRUD.increment_view_count(db, product_id)
     
-    return product
+    return cached_json_response(request, entry)
+
+
+@router.get("/{product_id}/similar", response_model=list[ProductResponse])
+async def get_similar_products(
+    product_id: UUID,
+    limit: int = Query(8, ge=1, le=50, description="Количество товаров"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Получить похожие товары
+
+    Похожесть считается по назначению, стали, категории, длине клинка, весу и цене
+    по индексу в памяти; из БД читаются только найденные товары.
+    Пока индекс строится после запуска воркера, отвечает 503.
+    """
+    if not similar_index.is_built:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Индекс похожих товаров ещё строится",
+        )
+
+    if product_id not in similar_index:
+        # Товар мог появиться до того, как индекс получил событие об изменении
+        await similar_index.refresh_product(db, product_id)
+        if product_id not in similar_index:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Товар не найден"
+            )
+
+    product_ids = similar_index.similar(product_id, limit)
+    return await ProductCRUD.get_by_ids(db, product_ids)
 
 
 @router.get("/slug/{slug}", response_model=ProductResponse)
 async def get_product_by_slug(
+    request: Request,
     slug: str,
     db: AsyncSession = Depends(get_db)
 ):
-    """Получить товар по slug"""
-    product = await ProductCRUD.get_by_slug(db, slug)
-    if not product:
+    """
+    Получить товар по slug
+
+    Прежний slug переименованного товара отвечает 301 на текущий адрес.
+    """
+    product_id = slug_index.products.resolve(slug)
+    if product_id is not None:
+        entry = await load_product_payload(db, product_id)
+        if entry is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Товар не найден"
+            )
+        await ProductCRUD.increment_view_count(db, product_id)
+        return cached_json_response(request, entry)
+
+    current = slug_index.products.redirect(slug)
+    if current is not None:
+        return RedirectResponse(
+            request.url_for("get_product_by_slug", slug=current),
+            status_code=status.HTTP_301_MOVED_PERMANENTLY,
+        )
+
+    # Карта ещё не получила событие о товаре (или не загружена)
+    found = await ProductCRUD.get_document_by_slug(db, slug)
+    if not found:
+        current = await ProductCRUD.get_current_slug(db, slug)
+        if current is not None:
+            return RedirectResponse(
+                request.url_for("get_product_by_slug", slug=current),
+                status_code=status.HTTP_301_MOVED_PERMANENTLY,
+            )
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Товар не найден"
         )
+    product_id, document = found
     
     # Увеличиваем счётчик просмотров
-    await ProductCRUD.increment_view_count(db, product.id)
+    await ProductCRUD.increment_view_count(db, product_id)
     
-    return product
+    return Response(content=document, media_type="application/json")
 
 
 @router.post("/", response_model=ProductResponse, status_code=status.HTTP_201_CREATED)
@@ -174,6 +376,7 @@ async def create_product(
         )
     
     product = await ProductCRUD.create(db, product_data)
+    response_cache.invalidate("featured:", "new:")
     return product
 
 
@@ -206,6 +409,7 @@ async def update_product(
             detail="Товар не найден"
         )
     
+    response_cache.invalidate("featured:", "new:", f"product:{product_id}")
     return product
 
 
@@ -228,4 +432,5 @@ async def delete_product(
             detail="Товар не найден"
         )
     
+    response_cache.invalidate("featured:", "new:", f"product:{product_id}")
     return None
\ No newline at end of file
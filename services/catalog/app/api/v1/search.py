@@ -0,0 +1,24 @@
+"""
+API endpoints поиска
+"""
+from fastapi import APIRouter, Query
+
+from app.schemas.search import SuggestionResponse
+from app.indexes.suggest import suggest_index
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+
+@router.get("/suggest", response_model=list[SuggestionResponse])
+async def suggest(
+    q: str = Query(..., min_length=1, max_length=100, description="Введённый префикс"),
+    limit: int = Query(10, ge=1, le=20, description="Количество подсказок"),
+):
+    """
+    Подсказки для строки поиска (search-as-you-type)
+
+    Отвечает из индекса в памяти без обращения к БД. Ищет по началу названий
+    товаров и категорий, материалов клинка и назначений, а также по началу
+    любого слова в них. Регистр и «ё»/«е» не различаются.
+    """
+    return suggest_index.suggest(q, limit)
@@ -0,0 +1,146 @@
+"""
+Служебные команды сервиса каталога
+
+Запуск: python -m app.cli <команда> [параметры]
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import time
+
+import httpx
+
+from app.core.config import settings
+from app.db.database import async_session_maker, engine
+
+
+async def bench_compression(args: argparse.Namespace) -> None:
+    """Процессорное время на запрос: сжатие на лету против готового варианта из кэша"""
+    from fastapi import Request
+    from app.api.v1.products import load_featured_payload
+    from app.core.cache import brotli, cached_json_response, response_cache
+
+    async with async_session_maker() as db:
+        entry = await load_featured_payload(db, args.limit)
+    await engine.dispose()
+
+    body = entry.raw
+    iterations = args.iterations
+
+    def per_request(func) -> float:
+        started = time.process_time()
+        for _ in range(iterations):
+            func()
+        return (time.process_time() - started) / iterations * 1e6
+
+    request = Request({"type": "http", "headers": [(b"accept-encoding", b"gzip, br")]})
+    results = [
+        ("gzip на лету", per_request(lambda: gzip.compress(body, compresslevel=settings.COMPRESSION_GZIP_LEVEL))),
+    ]
+    if brotli is not None:
+        results.append(
+            ("brotli на лету", per_request(lambda: brotli.compress(body, quality=settings.COMPRESSION_BROTLI_QUALITY)))
+        )
+    key = f"featured:{args.limit}"
+    results.append(
+        ("готовый вариант из кэша", per_request(lambda: cached_json_response(request, response_cache.get(key))))
+    )
+
+    print(f"Ответ /products/featured?limit={args.limit}: {len(body)} байт, "
+          f"gzip {len(entry.gzip or b'')} байт, br {len(entry.br or b'')} байт")
+    for name, microseconds in results:
+        print(f"  {name:<26} {microseconds:10.1f} мкс CPU на запрос")
+
+
+async def slow_queries(args: argparse.Namespace) -> None:
+    """Выгрузить общий буфер медленных запросов через работающий сервис"""
+    headers = {"X-Admin-Token": args.token}
+    async with httpx.AsyncClient(base_url=args.url, headers=headers, timeout=10) as client:
+        response = await client.get("/api/v1/admin/slow-queries", params={"limit": args.limit})
+        response.raise_for_status()
+        records = response.json()
+
+    if args.json:
+        print(json.dumps(records, ensure_ascii=False, indent=2))
+        return
+
+    for record in records:
+        print(f"--- {record['captured_at']}  {record['duration_ms']} мс  [{record['fingerprint']}]")
+        if record["filters"]:
+            print(f"фильтры: {json.dumps(record['filters'], ensure_ascii=False)}")
+        print(record["sql"])
+        if record["plan"]:
+            print(record["plan"])
+        print()
+
+
+async def filter_report(args: argparse.Namespace) -> None:
+    """Частые формы запросов списка товаров и рекомендуемые индексы"""
+    from app.core.filter_stats import load_filter_stats, reset_filter_stats
+    from app.core.index_advisor import recommend
+
+    if args.reset:
+        await reset_filter_stats()
+        print("Статистика фильтров очищена")
+        return
+
+    observed, shapes = await load_filter_stats()
+    if not observed:
+        print("Статистика фильтров пуста")
+        return
+
+    shapes = [item for item in shapes if item["count"] / observed >= args.min_share][:args.top]
+    print(f"Учтено запросов: {observed}")
+    print(f"{'доля':>7} {'запросов':>9} {'±':>6} {'ср. мс':>8}  форма")
+    for item in shapes:
+        print(f"{item['count'] / observed:7.1%} {item['count']:9} {item['error']:6} "
+              f"{item['mean_latency_ms']:8.1f}  {item['shape']}")
+
+    async with engine.connect() as connection:
+        recommendations, hypothetical = await recommend(connection, shapes, observed)
+    await engine.dispose()
+
+    print()
+    if not hypothetical:
+        print("Расширение hypopg не установлено: выгода не оценивается (CREATE EXTENSION hypopg)")
+    for number, item in enumerate(recommendations, 1):
+        print(f"{number}. {item.candidate.ddl(concurrently=True)};")
+        print(f"   доля запросов {item.share:.1%}, форм {len(item.shapes)}")
+        if item.existing:
+            print(f"   уже покрыт индексом {item.existing}")
+        elif item.benefit is not None:
+            print(f"   стоимость плана {item.cost_before:.1f} -> {item.cost_after:.1f} "
+                  f"({item.benefit:.0%} дешевле, взвешенная выгода {item.benefit * item.share:.3f})")
+        else:
+            print("   без оценки")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    bench = commands.add_parser("bench-compression", help="Замер CPU на сжатие ответа")
+    bench.add_argument("--limit", type=int, default=10, help="Размер списка избранного")
+    bench.add_argument("--iterations", type=int, default=1000, help="Число повторов")
+    bench.set_defaults(handler=bench_compression)
+
+    slow = commands.add_parser("slow-queries", help="Выгрузить медленные запросы")
+    slow.add_argument("--url", default="http://localhost:8000", help="Адрес сервиса каталога")
+    slow.add_argument("--token", default=settings.ADMIN_API_TOKEN, help="Токен администратора (ADMIN_API_TOKEN)")
+    slow.add_argument("--limit", type=int, default=50, help="Количество записей")
+    slow.add_argument("--json", action="store_true", help="Вывести в JSON")
+    slow.set_defaults(handler=slow_queries)
+
+    report = commands.add_parser("filter-report", help="Отчёт по фильтрам и рекомендации индексов")
+    report.add_argument("--top", type=int, default=20, help="Количество форм запросов")
+    report.add_argument("--min-share", type=float, default=0.01, help="Минимальная доля формы запроса")
+    report.add_argument("--reset", action="store_true", help="Очистить накопленную статистику")
+    report.set_defaults(handler=filter_report)
+
+    args = parser.parse_args()
+    asyncio.run(args.handler(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+In-process кэш сериализованных ответов
+
+Хранит готовые JSON-байты горячих ответов (избранное, новинки, категории,
+карточки популярных товаров) вместе с заранее сжатыми вариантами gzip и brotli.
+Сжатие выполняется один раз при записи в кэш, а не на каждый запрос;
+NegotiatingGZipMiddleware сжимает на лету только некэшируемые ответы.
+"""
+import gzip
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware
+from prometheus_client import Counter
+
+from app.core.config import settings
+
+try:
+    import brotli
+except ImportError:  # brotli не обязателен: без него отдаём gzip
+    brotli = None
+
+COMPRESSION_CPU_COUNTER = Counter(
+    "catalog_precompression_cpu_seconds_total",
+    "Процессорное время на предварительное сжатие кэшируемых ответов",
+    ["encoding"],
+)
+
+
+class CachedBody:
+    """Тело ответа и его сжатые варианты"""
+    __slots__ = ("raw", "gzip", "br", "expires_at")
+
+    def __init__(self, raw: bytes, expires_at: float):
+        self.raw = raw
+        self.expires_at = expires_at
+        self.gzip: Optional[bytes] = None
+        self.br: Optional[bytes] = None
+
+        if len(raw) < settings.COMPRESSION_MINIMUM_SIZE:
+            return
+
+        started = time.process_time()
+        self.gzip = gzip.compress(raw, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+        COMPRESSION_CPU_COUNTER.labels(encoding="gzip").inc(time.process_time() - started)
+
+        if brotli is not None:
+            started = time.process_time()
+            self.br = brotli.compress(raw, quality=settings.COMPRESSION_BROTLI_QUALITY)
+            COMPRESSION_CPU_COUNTER.labels(encoding="br").inc(time.process_time() - started)
+
+
+class ResponseCache:
+    """LRU-кэш JSON-ответов с TTL в памяти воркера"""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, CachedBody] = OrderedDict()
+
+    def get(self, key: str) -> Optional[CachedBody]:
+        """Получить тело ответа, если оно не устарело"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at < time.monotonic():
+            self._entries.pop(key, None)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: str, body: bytes) -> CachedBody:
+        """Сохранить тело ответа, сжав его один раз"""
+        entry = CachedBody(body, time.monotonic() + self.ttl)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, *prefixes: str) -> None:
+        """Удалить записи с указанными префиксами ключа (без аргументов - все)"""
+        if not prefixes:
+            self._entries.clear()
+            return
+        for key in [k for k in self._entries if k.startswith(prefixes)]:
+            self._entries.pop(key, None)
+
+
+def choose_encoding(accept_encoding: str, available: tuple[str, ...]) -> Optional[str]:
+    """Доступная кодировка с наибольшим q в Accept-Encoding клиента
+
+    q=0 - отказ от кодировки; «*» задаёт q для неназванных. При равных q
+    побеждает более ранняя в available (br раньше gzip). Если клиент ставит
+    identity выше всех доступных кодировок, ответ отдаётся без сжатия (None).
+    """
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, *params = item.split(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = min(max(float(value), 0.0), 1.0)
+                except ValueError:
+                    quality = 0.0
+        accepted[name] = quality
+
+    default = accepted.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for encoding in available:
+        quality = accepted.get(encoding, default)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    if best is not None and accepted.get("identity", 0.0) > best_quality:
+        return None
+    return best
+
+
+def cached_json_response(request: Request, entry: CachedBody) -> Response:
+    """Ответ из кэша в кодировке, которую принимает клиент"""
+    headers = {"Vary": "Accept-Encoding"}
+    body = entry.raw
+    available = tuple(name for name in ("br", "gzip") if getattr(entry, name) is not None)
+    encoding = choose_encoding(request.headers.get("accept-encoding", ""), available)
+    if encoding:
+        body = getattr(entry, encoding)
+        # С заголовком Content-Encoding middleware не сжимает ответ повторно
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+class NegotiatingGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware с учётом q в Accept-Encoding
+
+    Starlette сжимает ответ, если в заголовке просто встречается «gzip», в том
+    числе при gzip;q=0. Здесь gzip выбирается тем же choose_encoding, что и
+    для кэшированных ответов.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "http":
+            accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+            if choose_encoding(accept_encoding, ("gzip",)) is None:
+                await self.app(scope, receive, send)
+                return
+        await super().__call__(scope, receive, send)
+
+
+response_cache = ResponseCache(settings.RESPONSE_CACHE_TTL, settings.RESPONSE_CACHE_MAX_ENTRIES)
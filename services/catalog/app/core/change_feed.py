@@ -0,0 +1,234 @@
+"""
+Лента изменений каталога
+
+Триггеры publish_catalog_change() пишут каждое изменение товара или категории
+в catalog_changes и отправляют его через NOTIFY catalog_changes. Воркер держит
+одно выделенное соединение с LISTEN и раздаёт события:
+
+- SSE-подписчикам (orders, admin, notifications) через ограниченные очереди;
+  отставший подписчик не тормозит остальных, а догоняет ленту из таблицы;
+- внутренним слушателям (кэши и индексы в памяти этого воркера).
+
+seq выдаётся при вставке строки, а не при фиксации транзакции: параллельные
+транзакции фиксируются (и отправляют NOTIFY) не в порядке seq. Поэтому
+позиция клиента - не граница «всё, что меньше, уже доставлено»: при
+возобновлении лента перечитывается с запасом CHANGE_FEED_REORDER_WINDOW seq
+назад, а повторы отсекаются по множеству доставленных seq. Изменения одной
+записи упорядочены блокировкой строки, поэтому для каждой записи события
+идут в порядке seq и повтор события не откатывает её состояние.
+"""
+import asyncio
+import json
+import logging
+from datetime import timedelta
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+import asyncpg
+from sqlalchemy import select, delete, func
+
+from app.core.config import settings
+from app.db.database import async_session_maker
+from app.db.models import CatalogChange
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "catalog_changes"
+
+# Синтетическое событие: пропущенные изменения неизвестны, данные нужно
+# перечитать целиком. Получают внутренние слушатели после переподключения
+# LISTEN и SSE-клиенты, чью позицию нельзя продолжить из таблицы
+RESYNC_EVENT = {"seq": None, "entity": "resync", "op": "resync", "id": None, "data": None}
+
+Listener = Callable[[dict], Awaitable[None]]
+
+
+class DeliveredSeqs:
+    """seq событий, уже отправленных клиенту, в пределах окна переупорядочивания"""
+
+    def __init__(self, window: int, resume_seq: Optional[int] = None):
+        self.window = window
+        # Наибольший известный клиенту seq: с него (минус окно) продолжается лента
+        self.high = resume_seq
+        self._seen: set[int] = set()
+
+    def add(self, seq: int) -> bool:
+        """Отметить событие; False - оно уже было отправлено"""
+        if seq in self._seen:
+            return False
+        self._seen.add(seq)
+        if self.high is None or seq > self.high:
+            self.high = seq
+        if len(self._seen) > 2 * self.window:
+            floor = self.high - self.window
+            self._seen = {item for item in self._seen if item > floor}
+        return True
+
+    def replay_from(self) -> Optional[int]:
+        """seq, после которого перечитывать таблицу; None - позиция неизвестна"""
+        if self.high is None:
+            return None
+        return max(self.high - self.window, 0)
+
+
+class Subscription:
+    """Подписка SSE-клиента на ленту"""
+
+    def __init__(self, maxsize: int):
+        self.queue: asyncio.Queue[dict] = asyncio.Queue(maxsize)
+        # Очередь переполнилась или пропали уведомления: клиент должен догнать ленту из таблицы
+        self.lagging = False
+
+    def mark_lagging(self) -> None:
+        """Потребовать догоняющее чтение и разбудить ожидающий поток"""
+        self.lagging = True
+        try:
+            self.queue.put_nowait(RESYNC_EVENT)
+        except asyncio.QueueFull:
+            pass
+
+    def reset(self) -> None:
+        """Сбросить очередь перед догоняющим чтением из таблицы"""
+        self.lagging = False
+        while not self.queue.empty():
+            self.queue.get_nowait()
+
+
+class ChangeFeed:
+    """Приём NOTIFY и раздача событий подписчикам"""
+
+    def __init__(self):
+        self._subscriptions: set[Subscription] = set()
+        self._listeners: list[Listener] = []
+        self._pending: asyncio.Queue[dict] = asyncio.Queue()
+        self._tasks: list[asyncio.Task] = []
+
+    def add_listener(self, listener: Listener) -> None:
+        """Зарегистрировать внутреннего слушателя (вызывается последовательно для каждого события)"""
+        self._listeners.append(listener)
+
+    def subscribe(self) -> Subscription:
+        """Создать подписку SSE-клиента"""
+        subscription = Subscription(settings.CHANGE_FEED_QUEUE_SIZE)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Удалить подписку"""
+        self._subscriptions.discard(subscription)
+
+    async def start(self) -> None:
+        """Запустить приём уведомлений и фоновые задачи"""
+        self._tasks = [
+            asyncio.create_task(self._listen()),
+            asyncio.create_task(self._dispatch()),
+            asyncio.create_task(self._prune()),
+        ]
+
+    async def stop(self) -> None:
+        """Остановить фоновые задачи"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def publish(self, event: dict) -> None:
+        """Раздать событие подписчикам и внутренним слушателям"""
+        for subscription in self._subscriptions:
+            if subscription.lagging:
+                continue
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                subscription.lagging = True
+        self._pending.put_nowait(event)
+
+    def _on_notify(self, connection, pid, channel, payload: str) -> None:
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.warning("Некорректное событие ленты изменений: %s", payload)
+            return
+        self.publish(event)
+
+    async def _listen(self) -> None:
+        """Держать соединение с LISTEN, переподключаясь при обрыве"""
+        connected_before = False
+        while True:
+            connection: Optional[asyncpg.Connection] = None
+            try:
+                connection = await asyncpg.connect(settings.DATABASE_URL)
+                terminated = asyncio.Event()
+                connection.add_termination_listener(lambda _: terminated.set())
+                await connection.add_listener(CHANNEL, self._on_notify)
+                if connected_before:
+                    # Уведомления за время обрыва потеряны: кэши перечитывают данные,
+                    # SSE-клиенты дочитывают пропущенное из catalog_changes
+                    self._pending.put_nowait(RESYNC_EVENT)
+                    for subscription in self._subscriptions:
+                        subscription.mark_lagging()
+                connected_before = True
+                await terminated.wait()
+                logger.warning("Соединение ленты изменений закрыто, переподключение")
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning("Ошибка соединения ленты изменений: %s", exc)
+            finally:
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(settings.CHANGE_FEED_RECONNECT_SECONDS)
+
+    async def _dispatch(self) -> None:
+        """Передать события внутренним слушателям вне обработчика NOTIFY"""
+        while True:
+            event = await self._pending.get()
+            for listener in self._listeners:
+                try:
+                    await listener(event)
+                except Exception:
+                    logger.exception("Ошибка слушателя ленты изменений")
+
+    async def _prune(self) -> None:
+        """Удалять события старше CHANGE_FEED_RETENTION_DAYS"""
+        while True:
+            try:
+                async with async_session_maker() as db:
+                    await db.execute(
+                        delete(CatalogChange).where(
+                            CatalogChange.created_at
+                            < func.now() - timedelta(days=settings.CHANGE_FEED_RETENTION_DAYS)
+                        )
+                    )
+                    await db.commit()
+            except Exception as exc:
+                logger.warning("Не удалось очистить ленту изменений: %s", exc)
+            await asyncio.sleep(3600)
+
+
+async def replay(after_seq: int) -> AsyncIterator[dict]:
+    """События из таблицы с seq больше after_seq, постранично"""
+    while True:
+        async with async_session_maker() as db:
+            result = await db.execute(
+                select(CatalogChange)
+                .where(CatalogChange.seq > after_seq)
+                .order_by(CatalogChange.seq)
+                .limit(settings.CHANGE_FEED_REPLAY_BATCH)
+            )
+            changes = result.scalars().all()
+
+        for change in changes:
+            yield change.as_event()
+        if len(changes) < settings.CHANGE_FEED_REPLAY_BATCH:
+            return
+        after_seq = changes[-1].seq
+
+
+async def is_retained(after_seq: int) -> bool:
+    """Можно ли продолжить ленту с after_seq (события не удалены очисткой)"""
+    async with async_session_maker() as db:
+        oldest = (await db.execute(select(func.min(CatalogChange.seq)))).scalar()
+    return oldest is None or oldest <= after_seq + 1
+
+
+change_feed = ChangeFeed()
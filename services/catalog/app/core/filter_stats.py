@@ -0,0 +1,168 @@
+"""
+Статистика использования фильтров каталога
+
+Каждый вызов ProductCRUD.get_list сводится к «форме» запроса: какие фильтры
+заданы, значения низкоселективных фильтров (status, is_featured, is_new) и
+сортировка. Частоты и латентность форм агрегируются в памяти воркера
+алгоритмом Space-Saving: не больше FILTER_STATS_CAPACITY форм, редкие
+вытесняются частыми. Раз в FILTER_STATS_FLUSH_SECONDS накопленное сбрасывается
+в Redis, где суммируется по всем воркерам; по этим данным
+`python -m app.cli filter-report` подбирает индексы.
+"""
+import asyncio
+import json
+import logging
+import random
+from typing import Optional
+
+from app.core.config import settings
+from app.core.redis import redis_client
+
+logger = logging.getLogger(__name__)
+
+REDIS_PREFIX = "catalog:filter_stats"
+
+# Фильтры, значение которых входит в форму: по ним строятся частичные индексы
+VALUE_FILTERS = ("status", "is_featured", "is_new")
+
+SHAPE_FILTERS = (
+    "category_id", "min_price", "max_price", "status", "blade_material",
+    "min_blade_length", "max_blade_length", "min_weight", "max_weight",
+    "hardness_hrc", "purpose", "is_featured", "is_new", "search",
+)
+
+
+def filter_shape(filters) -> str:
+    """Форма запроса: «category_id,status=in_stock|sort=price:asc»"""
+    parts = []
+    for name in SHAPE_FILTERS:
+        value = getattr(filters, name)
+        if value is None or value == "":
+            continue
+        if name in VALUE_FILTERS:
+            value = getattr(value, "value", value)
+            parts.append(f"{name}={str(value).lower()}")
+        else:
+            parts.append(name)
+    return f"{','.join(parts)}|sort={filters.sort_by}:{filters.sort_order}"
+
+
+class ShapeCounter:
+    """Счётчик формы запроса в Space-Saving"""
+    __slots__ = ("count", "error", "samples", "latency_sum", "latency_max", "example")
+
+    def __init__(self, count: int, error: int):
+        self.count = count
+        self.error = error
+        self.samples = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.example: Optional[dict] = None
+
+
+class FilterUsageSampler:
+    """Ограниченный top-k форм запросов с периодическим сбросом в Redis"""
+
+    def __init__(self, capacity: int, sample_rate: float, flush_interval: float):
+        self.capacity = capacity
+        self.sample_rate = sample_rate
+        self.flush_interval = flush_interval
+        self._counters: dict[str, ShapeCounter] = {}
+        self._observed = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, filters, latency: float) -> None:
+        """Учесть выполненный запрос списка товаров"""
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        self._observed += 1
+        shape = filter_shape(filters)
+
+        counter = self._counters.get(shape)
+        if counter is None:
+            if len(self._counters) < self.capacity:
+                counter = ShapeCounter(0, 0)
+            else:
+                # Новая форма занимает место самой редкой и наследует её счёт как погрешность
+                evicted = min(self._counters, key=lambda key: self._counters[key].count)
+                floor = self._counters.pop(evicted).count
+                counter = ShapeCounter(floor, floor)
+            self._counters[shape] = counter
+
+        counter.count += 1
+        counter.samples += 1
+        counter.latency_sum += latency
+        counter.latency_max = max(counter.latency_max, latency)
+        counter.example = filters.model_dump(mode="json", exclude_defaults=True)
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        await self.flush()
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Добавить накопленное в общие счётчики Redis и начать новый интервал"""
+        if not self._counters:
+            return
+        counters, observed = self._counters, self._observed
+        self._counters, self._observed = {}, 0
+
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.hincrby(f"{REDIS_PREFIX}:meta", "observed", observed)
+        for shape, counter in counters.items():
+            pipe.hincrby(f"{REDIS_PREFIX}:count", shape, counter.count)
+            pipe.hincrby(f"{REDIS_PREFIX}:error", shape, counter.error)
+            pipe.hincrby(f"{REDIS_PREFIX}:samples", shape, counter.samples)
+            pipe.hincrbyfloat(f"{REDIS_PREFIX}:latency_sum", shape, counter.latency_sum)
+            pipe.hset(f"{REDIS_PREFIX}:example", shape, json.dumps(counter.example, ensure_ascii=False))
+        try:
+            await pipe.execute()
+        except Exception:
+            # Статистика не критична: интервал теряется, следующий начнётся с нуля
+            logger.warning("Не удалось сохранить статистику фильтров в Redis", exc_info=True)
+
+
+async def load_filter_stats() -> tuple[int, list[dict]]:
+    """Суммарная статистика всех воркеров: число запросов и формы по убыванию частоты"""
+    observed = int(await redis_client.hget(f"{REDIS_PREFIX}:meta", "observed") or 0)
+    counts = await redis_client.hgetall(f"{REDIS_PREFIX}:count")
+    errors = await redis_client.hgetall(f"{REDIS_PREFIX}:error")
+    samples = await redis_client.hgetall(f"{REDIS_PREFIX}:samples")
+    latency = await redis_client.hgetall(f"{REDIS_PREFIX}:latency_sum")
+    examples = await redis_client.hgetall(f"{REDIS_PREFIX}:example")
+
+    shapes = []
+    for shape, count in counts.items():
+        shape_samples = int(samples.get(shape, 0))
+        shapes.append({
+            "shape": shape,
+            "count": int(count),
+            "error": int(errors.get(shape, 0)),
+            "mean_latency_ms": float(latency.get(shape, 0)) / shape_samples * 1000 if shape_samples else 0.0,
+            "example": json.loads(examples[shape]) if shape in examples else {},
+        })
+    shapes.sort(key=lambda item: item["count"], reverse=True)
+    return observed, shapes
+
+
+async def reset_filter_stats() -> None:
+    """Удалить накопленную статистику"""
+    await redis_client.delete(*(
+        f"{REDIS_PREFIX}:{name}" for name in ("meta", "count", "error", "samples", "latency_sum", "example")
+    ))
+
+
+filter_usage = FilterUsageSampler(
+    capacity=settings.FILTER_STATS_CAPACITY,
+    sample_rate=settings.FILTER_STATS_SAMPLE_RATE,
+    flush_interval=settings.FILTER_STATS_FLUSH_SECONDS,
+)
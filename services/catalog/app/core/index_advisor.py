@@ -0,0 +1,301 @@
+"""
+Подбор индексов по статистике фильтров
+
+Для каждой частой формы запроса списка товаров строится индекс-кандидат:
+столбцы фильтров на равенство, затем первый фильтр по диапазону (или столбец
+сортировки, чтобы индекс отдавал страницу уже упорядоченной), а значения
+status / is_featured / is_new (без фильтра по статусу - условие «горячих»
+товаров status <> 'discontinued') уходят в условие частичного индекса. Фильтры
+ILIKE получают отдельные кандидаты GIN pg_trgm.
+
+Выгода оценивается гипотетическими индексами HypoPG: EXPLAIN запроса-примера
+до и после hypopg_create_index, без построения настоящего индекса. Если
+расширение hypopg не установлено, отчёт выводит кандидатов без оценки.
+"""
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Optional
+
+from sqlalchemy import ColumnElement
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.crud.product import ProductCRUD, is_hot
+from app.db.models import Product, ProductStatus
+from app.schemas.product import ProductFilter
+
+EQUALITY_COLUMNS = ("category_id", "hardness_hrc")
+
+# Фильтр по диапазону -> столбец; в B-tree эффективен только первый диапазон
+RANGE_COLUMNS = {
+    "min_price": "price",
+    "max_price": "price",
+    "min_blade_length": "blade_length",
+    "max_blade_length": "blade_length",
+    "min_weight": "weight",
+    "max_weight": "weight",
+}
+
+# Фильтр ILIKE -> столбцы; name уже покрыт idx_products_name_trgm
+TEXT_COLUMNS = {
+    "blade_material": ("blade_material",),
+    "purpose": ("purpose",),
+    "search": ("description", "blade_material", "purpose"),
+}
+
+# HypoPG умеет гипотетические btree, но не GIN
+HYPOTHETICAL_METHODS = ("btree",)
+
+
+@dataclass
+class IndexCandidate:
+    """Предлагаемый индекс на products"""
+    columns: tuple[str, ...]
+    method: str = "btree"
+    predicate: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        suffix = "_trgm" if self.method == "gin" else ""
+        name = "idx_products_" + "_".join(self.columns) + suffix
+        if self.predicate:
+            words = re.findall(r"[a-z0-9]+|!=", self.predicate.lower())
+            name += "_" + "_".join("not" if word == "!=" else word for word in words)
+        return name[:63]
+
+    def ddl(self, concurrently: bool = False) -> str:
+        if self.method == "gin":
+            columns = ", ".join(f"{column} gin_trgm_ops" for column in self.columns)
+        else:
+            columns = ", ".join(self.columns)
+        statement = "CREATE INDEX " + ("CONCURRENTLY " if concurrently else "")
+        statement += f"{self.name} ON products USING {self.method} ({columns})"
+        if self.predicate:
+            statement += f" WHERE {self.predicate}"
+        return statement
+
+
+@dataclass
+class Recommendation:
+    """Кандидат и формы запросов, которым он помогает"""
+    candidate: IndexCandidate
+    shapes: list[dict] = field(default_factory=list)
+    share: float = 0.0
+    benefit: Optional[float] = None
+    cost_before: float = 0.0
+    cost_after: Optional[float] = None
+    existing: Optional[str] = None
+
+
+def parse_shape(shape: str) -> tuple[dict[str, Optional[str]], str, str]:
+    """Форма запроса -> (фильтры со значениями, столбец сортировки, направление)"""
+    filters_part, _, sort_part = shape.partition("|sort=")
+    filters: dict[str, Optional[str]] = {}
+    for item in filter(None, filters_part.split(",")):
+        name, _, value = item.partition("=")
+        filters[name] = value or None
+    sort_by, _, sort_order = sort_part.partition(":")
+    return filters, sort_by or "created_at", sort_order or "desc"
+
+
+def _compile(expression: ColumnElement, connection: AsyncConnection) -> str:
+    return str(expression.compile(
+        dialect=connection.dialect,
+        compile_kwargs={"literal_binds": True, "include_table": False},
+    ))
+
+
+def candidates_for(shape: str, connection: AsyncConnection) -> list[IndexCandidate]:
+    """Индексы-кандидаты для формы запроса"""
+    filters, sort_by, _ = parse_shape(shape)
+
+    # Запросы витрины без фильтра по статусу ограничены «горячими» товарами
+    predicates = [Product.status == ProductStatus(filters["status"])] if filters.get("status") else [is_hot]
+    for flag in ("is_featured", "is_new"):
+        # Условие «= false» не отсекает большую часть таблицы
+        if filters.get(flag) == "true":
+            predicates.append(getattr(Product, flag) == True)
+    predicate = " AND ".join(_compile(item, connection) for item in predicates)
+
+    columns = [name for name in EQUALITY_COLUMNS if name in filters]
+    range_column = next((RANGE_COLUMNS[name] for name in RANGE_COLUMNS if name in filters), None)
+    if range_column:
+        columns.append(range_column)
+    elif sort_by not in columns:
+        columns.append(sort_by)
+
+    result = [IndexCandidate(tuple(columns), predicate=predicate)]
+    for name, text_columns in TEXT_COLUMNS.items():
+        if name in filters:
+            result.extend(IndexCandidate((column,), method="gin") for column in text_columns)
+    return result
+
+
+async def existing_indexes(connection: AsyncConnection) -> list[tuple[str, str]]:
+    """Индексы products: (имя, определение)"""
+    result = await connection.exec_driver_sql(
+        "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = 'products'"
+    )
+    return [(row[0], row[1]) for row in result]
+
+
+# Флаги витрины: частичный индекс по ним мал, порядок его столбцов не важен
+FLAG_COLUMNS = ("is_featured", "is_new")
+
+_cast = re.compile(r"::(?:character varying|double precision|timestamp with time zone|\w+)(?:\[\])?")
+_parenthesized_identifier = re.compile(r"\((\w+)\)")
+
+
+def _strip_parens(text: str) -> str:
+    """Снять скобки, охватывающие всё выражение"""
+    while text.startswith("(") and text.endswith(")"):
+        depth = 0
+        for position, char in enumerate(text):
+            depth += {"(": 1, ")": -1}.get(char, 0)
+            if depth == 0 and position < len(text) - 1:
+                return text
+        text = text[1:-1].strip()
+    return text
+
+
+def _split_and(text: str) -> list[str]:
+    """Части выражения, соединённые AND вне скобок"""
+    parts, depth, start = [], 0, 0
+    lowered = text.lower()
+    for position, char in enumerate(text):
+        depth += {"(": 1, ")": -1}.get(char, 0)
+        if depth == 0 and lowered.startswith(" and ", position):
+            parts.append(text[start:position])
+            start = position + len(" and ")
+    parts.append(text[start:])
+    return parts
+
+
+def predicate_conjuncts(predicate: Optional[str]) -> frozenset[str]:
+    """Условие частичного индекса как множество нормализованных конъюнктов
+
+    Приводит к одному виду условие кандидата (SQLAlchemy) и определение из
+    pg_indexes: без приведений типов и лишних скобок, «!=» как «<>»,
+    «flag = true» как «flag».
+    """
+    if not predicate:
+        return frozenset()
+    text = _cast.sub("", predicate.replace('"', ""))
+    text = _parenthesized_identifier.sub(r"\1", text)
+    text = " ".join(text.replace("!=", "<>").split())
+
+    conjuncts = set()
+    pending = [text]
+    while pending:
+        parts = _split_and(_strip_parens(pending.pop()))
+        if len(parts) > 1:
+            pending.extend(parts)
+            continue
+        part = _strip_parens(parts[0])
+        part = re.sub(r"^(\w+) = true$", r"\1", part, flags=re.IGNORECASE)
+        part = re.sub(r"^(\w+) = false$", r"NOT \1", part, flags=re.IGNORECASE)
+        conjuncts.add(re.sub(r"\b(AND|OR|NOT)\b", lambda match: match.group(1).upper(), part, flags=re.IGNORECASE))
+    return frozenset(conjuncts)
+
+
+def find_existing(candidate: IndexCandidate, indexes: list[tuple[str, str]]) -> Optional[str]:
+    """Имя существующего индекса, который уже покрывает кандидата
+
+    Индекс годится, если условие запроса влечёт условие индекса (все его
+    конъюнкты есть у кандидата) и его первые столбцы совпадают со столбцами
+    кандидата. Частичный индекс по флагу витрины с тем же условием, что у
+    кандидата, покрывает его при любых столбцах.
+    """
+    wanted = predicate_conjuncts(candidate.predicate)
+    for name, definition in indexes:
+        match = re.search(r"USING (\w+) \((.*?)\)(?: WHERE (.*))?$", definition)
+        if not match or match.group(1) != candidate.method:
+            continue
+        condition = predicate_conjuncts(match.group(3))
+        if not condition <= wanted:
+            continue
+        columns = tuple(part.strip().split()[0].strip('"') for part in match.group(2).split(","))
+        if columns[:len(candidate.columns)] == candidate.columns:
+            return name
+        if condition == wanted and condition & set(FLAG_COLUMNS):
+            return name
+    return None
+
+
+async def has_hypopg(connection: AsyncConnection) -> bool:
+    result = await connection.exec_driver_sql("SELECT 1 FROM pg_extension WHERE extname = 'hypopg'")
+    return result.first() is not None
+
+
+async def plan_cost(connection: AsyncConnection, statements: list[str]) -> tuple[float, str]:
+    """Суммарная оценка стоимости запросов по EXPLAIN и планы в JSON"""
+    total = 0.0
+    plans = []
+    for statement in statements:
+        result = await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}")
+        plan = result.scalar()
+        plan = json.loads(plan) if isinstance(plan, str) else plan
+        total += plan[0]["Plan"]["Total Cost"]
+        plans.append(json.dumps(plan))
+    return total, "\n".join(plans)
+
+
+def example_statements(example: dict, connection: AsyncConnection) -> list[str]:
+    """SQL страницы и подсчёта для сохранённого примера фильтров"""
+    query, count_query = ProductCRUD.list_query(ProductFilter(**example))
+    compile_kwargs = {"literal_binds": True}
+    return [
+        str(query.compile(dialect=connection.dialect, compile_kwargs=compile_kwargs)),
+        str(count_query.compile(dialect=connection.dialect, compile_kwargs=compile_kwargs)),
+    ]
+
+
+async def recommend(
+    connection: AsyncConnection,
+    shapes: list[dict],
+    observed: int,
+) -> tuple[list[Recommendation], bool]:
+    """Рекомендации по убыванию взвешенной выгоды; второй элемент - была ли оценка HypoPG"""
+    indexes = await existing_indexes(connection)
+    hypothetical = await has_hypopg(connection)
+    recommendations: dict[str, Recommendation] = {}
+
+    for item in shapes:
+        share = item["count"] / observed if observed else 0.0
+        statements = example_statements(item["example"], connection)
+        cost_before, _ = await plan_cost(connection, statements)
+
+        for candidate in candidates_for(item["shape"], connection):
+            recommendation = recommendations.setdefault(
+                candidate.ddl(), Recommendation(candidate, existing=find_existing(candidate, indexes))
+            )
+            recommendation.shapes.append(item)
+            recommendation.share += share
+            recommendation.cost_before += cost_before * share
+
+            if recommendation.existing or not hypothetical or candidate.method not in HYPOTHETICAL_METHODS:
+                continue
+            result = await connection.exec_driver_sql(
+                "SELECT indexrelid FROM hypopg_create_index($1)", (candidate.ddl(),)
+            )
+            index_oid = result.scalar()
+            try:
+                cost_after, plans = await plan_cost(connection, statements)
+            finally:
+                await connection.exec_driver_sql("SELECT hypopg_reset()")
+            # Планировщик не выбрал индекс - выгоды для этой формы нет
+            if f"<{index_oid}>" not in plans:
+                cost_after = cost_before
+            recommendation.cost_after = (recommendation.cost_after or 0.0) + cost_after * share
+
+    for recommendation in recommendations.values():
+        if recommendation.cost_after is not None and recommendation.cost_before:
+            # Доля сэкономленной стоимости, взвешенная по частоте форм
+            recommendation.benefit = 1 - recommendation.cost_after / recommendation.cost_before
+
+    ranked = sorted(
+        recommendations.values(),
+        key=lambda item: (item.existing is None, (item.benefit or 0.0) * item.share, item.share),
+        reverse=True,
+    )
+    return ranked, hypothetical
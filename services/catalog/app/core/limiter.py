@@ -0,0 +1,236 @@
+"""
+Адаптивное ограничение параллельности запросов
+
+Вместо того чтобы все запросы ждали соединение из пула в get_db и латентность
+росла у всех, middleware пропускает к обработчикам не больше `limit` запросов
+одновременно. Лимит подстраивается по AIMD: растёт на 1/limit после быстрого
+запроса и умножается на LIMITER_BACKOFF после медленного. Остальные запросы
+ждут в очереди по приоритету со своим сроком, а по его истечении (или при
+переполненной очереди) получают 503 с Retry-After.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import re
+import time
+from enum import IntEnum
+from typing import Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from app.core.config import settings
+
+
+class Priority(IntEnum):
+    """Приоритет запроса: меньше значение - раньше обслуживается"""
+    CRITICAL = 0
+    HIGH = 1
+    NORMAL = 2
+    LOW = 3
+
+
+# Сколько запрос готов ждать в очереди (сек)
+QUEUE_DEADLINES = {
+    Priority.CRITICAL: 3.0,
+    Priority.HIGH: 1.0,
+    Priority.NORMAL: 0.5,
+    Priority.LOW: 0.1,
+}
+
+# Правила приоритета: (метод, шаблон пути, приоритет); первое совпадение выигрывает
+PRIORITY_RULES = [
+    # Сервис заказов проверяет корзину и запрашивает товары по ID при оформлении
+    ("POST", re.compile(r"^/api/v1/products/validate-cart/?$"), Priority.CRITICAL),
+    ("POST", re.compile(r"^/api/v1/products/batch/?$"), Priority.CRITICAL),
+    ("GET", re.compile(r"^/api/v1/products/[0-9a-fA-F-]{36}/?$"), Priority.CRITICAL),
+    ("GET", re.compile(r"^/api/v1/products/slug/"), Priority.HIGH),
+    ("GET", re.compile(r"^/api/v1/categories"), Priority.HIGH),
+]
+
+# Поисковые роботы обслуживаются в последнюю очередь
+CRAWLER_USER_AGENT = re.compile(r"bot|crawl|spider|slurp|yandex|bingpreview|facebookexternalhit", re.IGNORECASE)
+
+# Не используют пул соединений или не должны отбрасываться
+EXEMPT_PREFIXES = (
+    "/health",
+    "/metrics",
+    "/docs",
+    "/redoc",
+    "/openapi.json",
+    "/api/v1/changes/stream",
+    "/api/v1/search/",
+    "/api/v1/admin/",
+)
+
+LIMIT_GAUGE = Gauge("catalog_limiter_limit", "Текущий лимит параллельных запросов", multiprocess_mode="livesum")
+INFLIGHT_GAUGE = Gauge("catalog_limiter_inflight", "Запросы в обработке", multiprocess_mode="livesum")
+QUEUE_DEPTH_GAUGE = Gauge("catalog_limiter_queue_depth", "Запросы в очереди", multiprocess_mode="livesum")
+SHED_COUNTER = Counter("catalog_limiter_shed_total", "Отброшенные запросы (503)", ["priority", "reason"])
+QUEUE_WAIT_HISTOGRAM = Histogram(
+    "catalog_limiter_queue_wait_seconds",
+    "Время ожидания в очереди",
+    ["priority"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+
+class AdaptiveLimiter:
+    """AIMD-лимитер с приоритетной очередью"""
+
+    def __init__(
+        self,
+        initial_limit: float,
+        min_limit: float,
+        max_limit: float,
+        latency_target: float,
+        backoff: float,
+        max_queue: int,
+    ):
+        self.limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.max_queue = max_queue
+        self.inflight = 0
+        # Элементы: [priority, seq, future]; future получает True (допущен) или False (вытеснен)
+        self._waiters: list[list] = []
+        self._sequence = itertools.count()
+        self._last_decrease = 0.0
+        LIMIT_GAUGE.set(self.limit)
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    def _update_gauges(self) -> None:
+        INFLIGHT_GAUGE.set(self.inflight)
+        QUEUE_DEPTH_GAUGE.set(self.queue_depth)
+
+    def _evict_lowest(self, priority: Priority) -> bool:
+        """Вытеснить из очереди ожидающего с приоритетом ниже priority"""
+        candidates = [entry for entry in self._waiters if not entry[2].done() and entry[0] > priority]
+        if not candidates:
+            return False
+        victim = max(candidates, key=lambda entry: (entry[0], entry[1]))
+        victim[2].set_result(False)
+        SHED_COUNTER.labels(priority=victim[0].name.lower(), reason="evicted").inc()
+        return True
+
+    async def acquire(self, priority: Priority) -> bool:
+        """Занять слот; False - запрос нужно отбросить"""
+        self._drain()
+        if self.inflight < self.limit and not self.queue_depth:
+            self.inflight += 1
+            self._update_gauges()
+            return True
+
+        if self.queue_depth >= self.max_queue and not self._evict_lowest(priority):
+            SHED_COUNTER.labels(priority=priority.name.lower(), reason="queue_full").inc()
+            return False
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, [priority, next(self._sequence), future])
+        self._update_gauges()
+        started = time.perf_counter()
+        try:
+            admitted = await asyncio.wait_for(future, QUEUE_DEADLINES[priority])
+        except asyncio.TimeoutError:
+            admitted = False
+            SHED_COUNTER.labels(priority=priority.name.lower(), reason="deadline").inc()
+        except asyncio.CancelledError:
+            # Клиент ушёл, но слот мог быть уже передан этому запросу
+            if future.done() and not future.cancelled() and future.result():
+                self.release(0.0)
+            raise
+        finally:
+            QUEUE_WAIT_HISTOGRAM.labels(priority=priority.name.lower()).observe(time.perf_counter() - started)
+            self._update_gauges()
+        return admitted
+
+    def release(self, latency: float) -> None:
+        """Освободить слот и скорректировать лимит по латентности запроса"""
+        self.inflight -= 1
+        now = time.monotonic()
+        if latency > self.latency_target:
+            # Не чаще раза за интервал, иначе пачка медленных запросов обрушит лимит
+            if now - self._last_decrease > self.latency_target:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._last_decrease = now
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        LIMIT_GAUGE.set(self.limit)
+        self._drain()
+        self._update_gauges()
+
+    def _drain(self) -> None:
+        """Передать свободные слоты ожидающим по приоритету, убрать из очереди отменённых"""
+        while self._waiters and (self.inflight < self.limit or self._waiters[0][2].done()):
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self.inflight += 1
+            future.set_result(True)
+
+
+def classify(scope) -> Optional[Priority]:
+    """Приоритет запроса; None - запрос не ограничивается"""
+    path = scope["path"]
+    if path.startswith(EXEMPT_PREFIXES):
+        return None
+
+    method = scope["method"]
+    if method == "GET":
+        for name, value in scope["headers"]:
+            if name == b"user-agent" and CRAWLER_USER_AGENT.search(value.decode("latin-1")):
+                return Priority.LOW
+
+    for rule_method, pattern, priority in PRIORITY_RULES:
+        if method == rule_method and pattern.match(path):
+            return priority
+    return Priority.NORMAL
+
+
+class ConcurrencyLimitMiddleware:
+    """ASGI middleware: очередь с приоритетами и отбрасывание при перегрузке"""
+
+    def __init__(self, app, limiter: Optional[AdaptiveLimiter] = None):
+        self.app = app
+        self.limiter = limiter or AdaptiveLimiter(
+            initial_limit=settings.LIMITER_INITIAL_LIMIT,
+            min_limit=settings.LIMITER_MIN_LIMIT,
+            max_limit=settings.LIMITER_MAX_LIMIT,
+            latency_target=settings.LIMITER_LATENCY_TARGET_SECONDS,
+            backoff=settings.LIMITER_BACKOFF,
+            max_queue=settings.LIMITER_MAX_QUEUE,
+        )
+
+    async def __call__(self, scope, receive, send):
+        priority = classify(scope) if scope["type"] == "http" else None
+        if priority is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await self.limiter.acquire(priority):
+            await self._reject(send)
+            return
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.limiter.release(time.perf_counter() - started)
+
+    async def _reject(self, send) -> None:
+        body = json.dumps({"detail": "Сервис перегружен, повторите запрос позже"}, ensure_ascii=False).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(settings.LIMITER_RETRY_AFTER_SECONDS).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,87 @@
+"""
+Доменные метрики каталога
+
+Гистограммы, по которым видно, куда уходит время запроса: методы CRUD,
+сериализация Pydantic и ожидание соединения из пула. Размер ответа по
+маршрутам и общая латентность собирает Instrumentator (app/main.py).
+
+При запуске под gunicorn (gunicorn.conf.py) задан PROMETHEUS_MULTIPROC_DIR:
+каждый воркер пишет значения в свои файлы в общем каталоге, а /metrics
+суммирует файлы всех воркеров, поэтому скрейп не зависит от того, какой
+воркер принял запрос.
+"""
+import functools
+import inspect
+import time
+
+from prometheus_client import Histogram
+from prometheus_fastapi_instrumentator.metrics import Info
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+CRUD_DURATION = Histogram(
+    "catalog_crud_duration_seconds",
+    "Время выполнения методов CRUD (включая ожидание соединения)",
+    ["method"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+SERIALIZATION_DURATION = Histogram(
+    "catalog_serialization_duration_seconds",
+    "Время валидации и сериализации ответа Pydantic",
+    ["schema"],
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+POOL_WAIT = Histogram(
+    "catalog_db_pool_wait_seconds",
+    "Время получения соединения из пула (включая открытие нового)",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+RESPONSE_SIZE = Histogram(
+    "catalog_response_size_bytes",
+    "Размер тела ответа по маршрутам (после сжатия)",
+    ["handler"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576),
+)
+
+
+def instrument_crud(cls):
+    """Декоратор класса CRUD: время каждого асинхронного метода в CRUD_DURATION"""
+    for name, attribute in list(vars(cls).items()):
+        if not isinstance(attribute, staticmethod) or not inspect.iscoroutinefunction(attribute.__func__):
+            continue
+        histogram = CRUD_DURATION.labels(method=f"{cls.__name__}.{name}")
+
+        def timed(func, histogram=histogram):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - started)
+            return wrapper
+
+        setattr(cls, name, staticmethod(timed(attribute.__func__)))
+    return cls
+
+
+def response_size(info: Info) -> None:
+    """Инструментация Instrumentator: размер ответа по шаблону маршрута"""
+    if info.response is None or "Content-Length" not in info.response.headers:
+        return
+    RESPONSE_SIZE.labels(handler=info.modified_handler).observe(int(info.response.headers["Content-Length"]))
+
+
+def serialization_timer(schema: str):
+    """Контекстный менеджер: время сериализации ответа схемы schema"""
+    return SERIALIZATION_DURATION.labels(schema=schema).time()
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Пул соединений asyncpg с замером ожидания свободного соединения"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - started)
@@ -0,0 +1,245 @@
+"""
+Рассылка уведомлений о поступлении и снижении цены по избранному
+
+Триггер enqueue_notification_fanout() в транзакции изменения товара ставит
+задание в notification_fanout_jobs, поэтому запрос администратора не ждёт
+рассылку. Фоновый воркер берёт задание (FOR UPDATE SKIP LOCKED - воркеры не
+мешают друг другу), обходит favorites товара keyset-курсором по user_id и
+пачками вставляет строки notifications. Курсор задания сдвигается в той же
+транзакции, что и вставка пачки, поэтому после сбоя рассылка продолжается
+с места остановки без повторов. Пользователь, уже получивший такое же
+уведомление о товаре в пределах FANOUT_DEDUP_HOURS, пропускается. ID
+созданных уведомлений передаются сервису уведомлений пачками через список
+Redis NOTIFICATIONS_QUEUE.
+"""
+import asyncio
+import json
+import logging
+from datetime import timedelta
+from typing import Optional
+from uuid import UUID
+
+from prometheus_client import Counter
+from redis import asyncio as aioredis
+from sqlalchemy import ARRAY, bindparam, column, func, or_, select, table, text, update
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+
+from app.core.config import settings
+from app.db.database import async_session_maker
+from app.db.models import NotificationFanoutJob
+
+logger = logging.getLogger(__name__)
+
+favorites = table(
+    "favorites",
+    column("user_id", PG_UUID(as_uuid=True)),
+    column("product_id", PG_UUID(as_uuid=True)),
+)
+
+# Вставка пачки уведомлений без тех, кто уже получил такое же за окно дедупликации
+INSERT_NOTIFICATIONS = text("""
+    INSERT INTO notifications (user_id, type, subject, message, metadata)
+    SELECT recipient.user_id, CAST(:type AS VARCHAR), CAST(:subject AS VARCHAR),
+           CAST(:message AS TEXT), CAST(:metadata AS JSONB)
+    FROM unnest(:user_ids) AS recipient(user_id)
+    WHERE NOT EXISTS (
+        SELECT 1 FROM notifications sent
+        WHERE sent.user_id = recipient.user_id
+          AND sent.metadata->>'dedup_key' = CAST(:dedup_key AS TEXT)
+          AND sent.created_at > now() - CAST(:window AS INTERVAL)
+    )
+    RETURNING id
+""").bindparams(bindparam("user_ids", type_=ARRAY(PG_UUID(as_uuid=True))))
+
+MESSAGES = {
+    "back_in_stock": (
+        "Товар снова в наличии",
+        "«{name}» из вашего избранного снова в наличии.",
+    ),
+    "price_drop": (
+        "Цена снижена",
+        "Цена на «{name}» из вашего избранного снижена до {price} ₽ (было {old_price} ₽).",
+    ),
+}
+
+NOTIFICATIONS_COUNTER = Counter(
+    "catalog_fanout_notifications_total",
+    "Созданные уведомления по избранному",
+    ["kind"],
+)
+JOBS_COUNTER = Counter(
+    "catalog_fanout_jobs_total",
+    "Завершённые задания рассылки",
+    ["kind"],
+)
+
+# Очередь сервиса уведомлений (его собственная база Redis)
+notifications_redis = aioredis.from_url(settings.NOTIFICATIONS_REDIS_URL, decode_responses=True)
+
+
+class NotificationFanout:
+    """Фоновый воркер заданий рассылки"""
+
+    def __init__(self):
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def wake(self) -> None:
+        """Проверить задания, не дожидаясь следующего опроса"""
+        self._wake.set()
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _run(self) -> None:
+        while True:
+            self._wake.clear()
+            try:
+                while await self._process_next():
+                    pass
+            except Exception:
+                logger.exception("Ошибка рассылки уведомлений по избранному")
+            try:
+                await asyncio.wait_for(self._wake.wait(), settings.FANOUT_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _claim(self):
+        """Взять следующее задание; None - заданий нет"""
+        lease = timedelta(seconds=settings.FANOUT_LOCK_SECONDS)
+        next_job = select(NotificationFanoutJob.id).where(
+            NotificationFanoutJob.finished_at.is_(None),
+            NotificationFanoutJob.attempts < settings.FANOUT_MAX_ATTEMPTS,
+            or_(NotificationFanoutJob.locked_until.is_(None), NotificationFanoutJob.locked_until < func.now()),
+        ).order_by(NotificationFanoutJob.id).limit(1).with_for_update(skip_locked=True).scalar_subquery()
+
+        async with async_session_maker() as db:
+            result = await db.execute(
+                update(NotificationFanoutJob)
+                .where(NotificationFanoutJob.id == next_job)
+                .values(locked_until=func.now() + lease, attempts=NotificationFanoutJob.attempts + 1)
+                .returning(
+                    NotificationFanoutJob.id,
+                    NotificationFanoutJob.product_id,
+                    NotificationFanoutJob.kind,
+                    NotificationFanoutJob.data,
+                    NotificationFanoutJob.cursor,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            job = result.one_or_none()
+            await db.commit()
+        return job
+
+    async def _process_next(self) -> bool:
+        """Разослать одно задание целиком; False - заданий нет"""
+        job = await self._claim()
+        if job is None:
+            return False
+
+        subject, template = MESSAGES[job.kind]
+        message = template.format(**job.data)
+        metadata = json.dumps({
+            "dedup_key": f"{job.kind}:{job.product_id}",
+            "kind": job.kind,
+            "product_id": str(job.product_id),
+            "slug": job.data["slug"],
+        }, ensure_ascii=False)
+
+        cursor = job.cursor
+        while True:
+            chunk = await self._send_chunk(job, cursor, subject, message, metadata)
+            if chunk is None:
+                logger.warning("Задание рассылки %s перехвачено другим воркером", job.id)
+                return True
+            cursor, notification_ids, finished = chunk
+
+            if notification_ids:
+                NOTIFICATIONS_COUNTER.labels(kind=job.kind).inc(len(notification_ids))
+                await self._enqueue(job, notification_ids)
+            if finished:
+                JOBS_COUNTER.labels(kind=job.kind).inc()
+                return True
+            await asyncio.sleep(settings.FANOUT_CHUNK_PAUSE_SECONDS)
+
+    async def _send_chunk(self, job, cursor: Optional[UUID], subject: str, message: str, metadata: str):
+        """Создать уведомления для следующей страницы избранного и сдвинуть курсор
+
+        Возвращает (новый курсор, ID уведомлений, задание завершено) или None,
+        если курсор задания уже сдвинул другой воркер.
+        """
+        page = select(favorites.c.user_id).where(favorites.c.product_id == job.product_id)
+        if cursor is not None:
+            page = page.where(favorites.c.user_id > cursor)
+        page = page.order_by(favorites.c.user_id).limit(settings.FANOUT_CHUNK_SIZE)
+
+        async with async_session_maker() as db:
+            user_ids = (await db.execute(page)).scalars().all()
+            notification_ids = []
+            if user_ids:
+                result = await db.execute(INSERT_NOTIFICATIONS, {
+                    "user_ids": list(user_ids),
+                    "type": settings.FANOUT_NOTIFICATION_TYPE,
+                    "subject": subject,
+                    "message": message,
+                    "metadata": metadata,
+                    "dedup_key": f"{job.kind}:{job.product_id}",
+                    "window": timedelta(hours=settings.FANOUT_DEDUP_HOURS),
+                })
+                notification_ids = [str(row.id) for row in result]
+
+            finished = len(user_ids) < settings.FANOUT_CHUNK_SIZE
+            new_cursor = user_ids[-1] if user_ids else cursor
+            values = {
+                "cursor": new_cursor,
+                "notified": NotificationFanoutJob.notified + len(notification_ids),
+                "locked_until": func.now() + timedelta(seconds=settings.FANOUT_LOCK_SECONDS),
+            }
+            if finished:
+                values["finished_at"] = func.now()
+            # Курсор сдвигается только если задание всё ещё наше
+            moved = await db.execute(
+                update(NotificationFanoutJob)
+                .where(
+                    NotificationFanoutJob.id == job.id,
+                    NotificationFanoutJob.cursor.is_(None) if cursor is None
+                    else NotificationFanoutJob.cursor == cursor,
+                )
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            if moved.rowcount == 0:
+                await db.rollback()
+                return None
+            await db.commit()
+        return new_cursor, notification_ids, finished
+
+    async def _enqueue(self, job, notification_ids: list[str]) -> None:
+        """Передать пачку уведомлений сервису уведомлений
+
+        Строки уже сохранены с is_sent = false: если Redis недоступен, сервис
+        уведомлений заберёт их при обходе неотправленных.
+        """
+        batch = json.dumps({
+            "kind": job.kind,
+            "product_id": str(job.product_id),
+            "notification_ids": notification_ids,
+        })
+        try:
+            await notifications_redis.rpush(settings.NOTIFICATIONS_QUEUE, batch)
+        except Exception:
+            logger.warning("Не удалось поставить пачку уведомлений в очередь", exc_info=True)
+
+
+notification_fanout = NotificationFanout()
+
+
+async def apply_change(event: dict) -> None:
+    """Слушатель ленты изменений: изменение товара могло поставить задание рассылки"""
+    if event["op"] == "resync" or (event["entity"] == "product" and event["op"] == "update"):
+        notification_fanout.wake()
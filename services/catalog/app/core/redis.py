@@ -0,0 +1,9 @@
+"""
+Клиент Redis
+"""
+from redis import asyncio as aioredis
+
+from app.core.config import settings
+
+# Подключение устанавливается лениво при первой команде
+redis_client = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
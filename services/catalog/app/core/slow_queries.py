@@ -0,0 +1,177 @@
+"""
+Запись медленных запросов
+
+Слушатели событий SQLAlchemy замеряют каждый SQL-запрос. Запросы дольше
+SLOW_QUERY_THRESHOLD_MS записываются вместе с нормализованным текстом и
+набором фильтров ProductFilter, с которым их построил ProductCRUD.get_list.
+Для доли SELECT-запросов фоновая задача получает план EXPLAIN (ANALYZE,
+BUFFERS) на отдельном соединении, вне пути обработки запроса.
+
+Записи всех воркеров складываются в общий список Redis, ограниченный
+SLOW_QUERY_BUFFER_SIZE: /admin/slow-queries и `python -m app.cli slow-queries`
+показывают одно и то же, какой бы воркер ни ответил. Запись уходит в Redis
+фоновой задачей; запрос с выбранным для EXPLAIN планом - после получения плана.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.config import settings
+from app.core.redis import redis_client
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY = "catalog:slow_queries"
+
+# Фильтры списка товаров, с которыми выполняется текущий запрос
+current_filters: ContextVar[Optional[dict]] = ContextVar("current_filters", default=None)
+
+_in_list = re.compile(r"\(\s*\$\d+(?:::[\w\[\]]+)?(?:\s*,\s*\$\d+(?:::[\w\[\]]+)?)+\s*\)")
+_placeholder = re.compile(r"\$\d+")
+_whitespace = re.compile(r"\s+")
+
+
+@contextmanager
+def query_filters(filters: Optional[dict]):
+    """Привязать фильтры к запросам внутри блока; после блока восстанавливается прежнее значение"""
+    token = current_filters.set(filters)
+    try:
+        yield
+    finally:
+        current_filters.reset(token)
+
+
+def normalize_sql(statement: str) -> str:
+    """Текст запроса без различий в числе элементов IN и номерах параметров"""
+    statement = _whitespace.sub(" ", statement).strip()
+    statement = _in_list.sub("(...)", statement)
+    return _placeholder.sub("$?", statement)
+
+
+class SlowQueryRecorder:
+    """Запись медленных запросов в общий буфер Redis с фоновым EXPLAIN"""
+
+    def __init__(self, threshold_ms: float, capacity: int, sample_rate: float):
+        self.threshold = threshold_ms / 1000
+        self.capacity = capacity
+        self.sample_rate = sample_rate
+        self._publish_queue: asyncio.Queue = asyncio.Queue(capacity)
+        self._explain_queue: asyncio.Queue = asyncio.Queue(settings.SLOW_QUERY_EXPLAIN_QUEUE)
+        self._engine: Optional[AsyncEngine] = None
+        self._tasks: list[asyncio.Task] = []
+
+    def install(self, engine: AsyncEngine) -> None:
+        """Подключить слушатели к движку"""
+        self._engine = engine
+        event.listen(engine.sync_engine, "before_cursor_execute", self._before_execute)
+        event.listen(engine.sync_engine, "after_cursor_execute", self._after_execute)
+        event.listen(engine.sync_engine, "handle_error", self._on_error)
+
+    async def start(self) -> None:
+        """Запустить фоновые задачи записи в Redis и EXPLAIN"""
+        self._tasks = [
+            asyncio.create_task(self._publish_worker()),
+            asyncio.create_task(self._explain_worker()),
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def records(self, limit: Optional[int] = None) -> list[dict]:
+        """Записи всех воркеров от новых к старым"""
+        end = (limit or self.capacity) - 1
+        return [json.loads(item) for item in await redis_client.lrange(REDIS_KEY, 0, end)]
+
+    async def clear(self) -> None:
+        await redis_client.delete(REDIS_KEY)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    def _on_error(self, exception_context):
+        # after_cursor_execute не вызывается для упавшего запроса: убираем его отметку
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("query_start_time"):
+            connection.info["query_start_time"].pop()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+        if elapsed < self.threshold:
+            return
+
+        normalized = normalize_sql(statement)
+        record = {
+            "fingerprint": hashlib.sha1(normalized.encode()).hexdigest()[:16],
+            "sql": normalized,
+            "duration_ms": round(elapsed * 1000, 2),
+            "filters": current_filters.get(),
+            "captured_at": datetime.now(timezone.utc).isoformat(),
+            "plan": None,
+        }
+
+        if not executemany and statement.lstrip().upper().startswith("SELECT") and random.random() < self.sample_rate:
+            try:
+                self._explain_queue.put_nowait((record, statement, tuple(parameters or ())))
+                return
+            except asyncio.QueueFull:
+                pass
+        self._publish(record)
+
+    def _publish(self, record: dict) -> None:
+        try:
+            self._publish_queue.put_nowait(record)
+        except asyncio.QueueFull:
+            # Redis не успевает: запись теряется, обработка запроса не ждёт
+            pass
+
+    async def _publish_worker(self) -> None:
+        while True:
+            records = [await self._publish_queue.get()]
+            while not self._publish_queue.empty():
+                records.append(self._publish_queue.get_nowait())
+            pipe = redis_client.pipeline(transaction=True)
+            pipe.lpush(REDIS_KEY, *(json.dumps(record, ensure_ascii=False, default=str) for record in records))
+            pipe.ltrim(REDIS_KEY, 0, self.capacity - 1)
+            try:
+                await pipe.execute()
+            except Exception:
+                logger.warning("Не удалось сохранить медленные запросы в Redis", exc_info=True)
+
+    async def _explain_worker(self) -> None:
+        while True:
+            record, statement, parameters = await self._explain_queue.get()
+            try:
+                record["plan"] = await self._explain(statement, parameters)
+            except Exception as exc:
+                record["plan"] = f"EXPLAIN failed: {exc}"
+            self._publish(record)
+
+    async def _explain(self, statement: str, parameters: tuple) -> str:
+        async with self._engine.connect() as conn:
+            raw = await conn.get_raw_connection()
+            driver = raw.driver_connection
+            # Напрямую через asyncpg: запрос не проходит через слушатели и не записывается снова
+            async with driver.transaction():
+                await driver.execute(f"SET LOCAL statement_timeout = {int(settings.SLOW_QUERY_EXPLAIN_TIMEOUT_MS)}")
+                rows = await driver.fetch(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", *parameters)
+        return "\n".join(row[0] for row in rows)
+
+
+slow_query_recorder = SlowQueryRecorder(
+    threshold_ms=settings.SLOW_QUERY_THRESHOLD_MS,
+    capacity=settings.SLOW_QUERY_BUFFER_SIZE,
+    sample_rate=settings.SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+)
@@ -0,0 +1,129 @@
+"""
+Прогрев воркера и проверка готовности
+
+При старте воркер открывает пул соединений до минимального размера,
+подготавливает горячие запросы ProductCRUD на каждом соединении
+и заполняет кэш категорий, избранного и новинок, строит индексы в памяти.
+До завершения прогрева /health/ready отвечает 503, чтобы балансировщик
+не отправлял трафик на «холодный» воркер.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from typing import Optional
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.redis import redis_client
+from app.db.database import engine, async_session_maker
+from app.crud.product import ProductCRUD, CategoryCRUD
+from app.schemas.product import ProductFilter
+from app.indexes.similar import similar_index
+from app.indexes.suggest import suggest_index
+from app.indexes.slugs import slug_index
+
+logger = logging.getLogger(__name__)
+
+# Параметры списков, которые запрашивает витрина по умолчанию
+WARMUP_LIST_LIMIT = 10
+
+
+class Readiness:
+    """Состояние готовности воркера"""
+
+    def __init__(self):
+        self.warmed_up = False
+        self.warmup_error: Optional[str] = None
+        self._checks: dict[str, bool] = {}
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def _check_postgres(self) -> bool:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        return True
+
+    async def _check_redis(self) -> bool:
+        return bool(await redis_client.ping())
+
+    async def _run_check(self, check) -> bool:
+        try:
+            return await asyncio.wait_for(check(), settings.HEALTH_CHECK_TIMEOUT_SECONDS)
+        except Exception:
+            return False
+
+    async def dependencies(self) -> dict[str, bool]:
+        """Состояние зависимостей, кэшируется на HEALTH_CHECK_CACHE_SECONDS"""
+        if time.monotonic() - self._checked_at < settings.HEALTH_CHECK_CACHE_SECONDS:
+            return self._checks
+
+        async with self._lock:
+            # Пока ждали блокировку, проверку мог выполнить другой запрос
+            if time.monotonic() - self._checked_at < settings.HEALTH_CHECK_CACHE_SECONDS:
+                return self._checks
+
+            postgres, redis = await asyncio.gather(
+                self._run_check(self._check_postgres),
+                self._run_check(self._check_redis),
+            )
+            self._checks = {"postgres": postgres, "redis": redis}
+            self._checked_at = time.monotonic()
+            return self._checks
+
+
+readiness = Readiness()
+
+
+async def _prepare_connection() -> None:
+    """Выполнить горячие запросы на одном соединении пула
+
+    asyncpg кэширует подготовленные выражения на уровне соединения,
+    поэтому каждый запрос нужно выполнить на каждом соединении.
+    """
+    async with async_session_maker() as db:
+        await ProductCRUD.get_document(db, uuid.UUID(int=0))
+        await ProductCRUD.get_document_by_slug(db, "")
+        await ProductCRUD.get_documents(db, [uuid.UUID(int=0)])
+        await ProductCRUD.get_list(db, ProductFilter(), record_usage=False)
+        await ProductCRUD.get_featured(db, WARMUP_LIST_LIMIT)
+        await ProductCRUD.get_new(db, WARMUP_LIST_LIMIT)
+        await CategoryCRUD.get_all(db)
+
+
+async def _preload_cache() -> None:
+    """Заполнить кэш ответов горячими списками и построить индексы в памяти"""
+    # Импорт здесь, чтобы избежать циклического импорта с роутерами
+    from app.api.v1.products import load_featured_payload, load_new_payload
+    from app.api.v1.categories import load_categories_payload
+
+    async with async_session_maker() as db:
+        await load_featured_payload(db, WARMUP_LIST_LIMIT)
+        await load_new_payload(db, WARMUP_LIST_LIMIT)
+        await load_categories_payload(db, None)
+        await load_categories_payload(db, True)
+        await similar_index.rebuild(db)
+        await suggest_index.rebuild(db)
+        await slug_index.rebuild(db)
+
+
+async def warm_up() -> None:
+    """Прогреть воркер; при недоступной БД повторять до успеха"""
+    while True:
+        started = time.perf_counter()
+        try:
+            # Параллельные сессии удерживают соединения одновременно,
+            # поэтому пул открывает DB_POOL_SIZE физических соединений
+            await asyncio.gather(*(_prepare_connection() for _ in range(settings.DB_POOL_SIZE)))
+            await _preload_cache()
+        except Exception as exc:
+            readiness.warmup_error = str(exc)
+            logger.warning("Прогрев не удался, повтор через %s с: %s", settings.DB_WARMUP_RETRY_SECONDS, exc)
+            await asyncio.sleep(settings.DB_WARMUP_RETRY_SECONDS)
+            continue
+
+        readiness.warmup_error = None
+        readiness.warmed_up = True
+        logger.info("Прогрев завершён за %.2f с", time.perf_counter() - started)
+        return
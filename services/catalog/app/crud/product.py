@@ -1,16 +1,39 @@
 """
 CRUD операции для работы с товарами
 """
+import time
+
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, or_, and_
+from sqlalchemy import Select, select, update, func, or_, and_, case, cast, column, literal_column, bindparam, null, Integer, Text
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID, aggregate_order_by, array
 from sqlalchemy.orm import selectinload
 from typing import Optional, List
 from uuid import UUID
 
-from app.db.models import Product, ProductImage, Category
+from app.db.models import Product, ProductImage, Category, ProductStatus, ProductDocument, SlugHistory
 from app.schemas.product import ProductCreate, ProductUpdate, ProductFilter
+from app.schemas.cart import CartItem
+from app.core.slow_queries import query_filters
+from app.core.filter_stats import filter_usage
+from app.core.metrics import instrument_crud
+
+# JSON карточки товара из read model с актуальными view_count и updated_at:
+# их изменение на каждый просмотр документ не пересобирает
+document_json = cast(
+    ProductDocument.document.op("||")(func.jsonb_build_object(
+        literal_column("'view_count'"), Product.view_count,
+        literal_column("'updated_at'"), func.api_timestamp(Product.updated_at),
+    )),
+    Text,
+)
 
+# Витрина работает только с товарами, которые не сняты с производства. Условие
+# записано литералом, а не параметром: только так планировщик применяет частичные
+# индексы WHERE status <> 'discontinued' и в общем плане подготовленного запроса
+is_hot = Product.status != literal_column("'discontinued'", type_=Product.status.type)
 
+
+@instrument_crud
 class ProductCRUD:
     """CRUD операции для товаров"""
 
@@ -35,20 +58,78 @@ class ProductCRUD:
         return result.scalar_one_or_none()
 
     @staticmethod
-    async def get_list(
-        db: AsyncSession,
-        filters: ProductFilter
-    ) -> tuple[List[Product], int]:
-        """Получить список товаров с фильтрацией и пагинацией"""
-        
+    async def get_current_slug(db: AsyncSession, old_slug: str) -> Optional[str]:
+        """Текущий slug товара, которому раньше принадлежал old_slug"""
+        query = select(Product.slug).join(SlugHistory, SlugHistory.entity_id == Product.id).where(
+            SlugHistory.entity == "product", SlugHistory.slug == old_slug
+        )
+        result = await db.execute(query)
+        return result.scalar_one_or_none()
+
+    @staticmethod
+    async def get_document(db: AsyncSession, product_id: UUID) -> Optional[str]:
+        """Готовый JSON карточки товара по ID"""
+        query = select(document_json).select_from(ProductDocument).join(
+            Product, Product.id == ProductDocument.product_id
+        ).where(ProductDocument.product_id == product_id)
+        result = await db.execute(query)
+        return result.scalar_one_or_none()
+
+    @staticmethod
+    async def get_document_by_slug(db: AsyncSession, slug: str) -> Optional[tuple[UUID, str]]:
+        """ID и готовый JSON карточки товара по slug"""
+        query = select(Product.id, document_json).select_from(Product).join(
+            ProductDocument, ProductDocument.product_id == Product.id
+        ).where(Product.slug == slug)
+        result = await db.execute(query)
+        return result.one_or_none()
+
+    @staticmethod
+    async def get_documents(db: AsyncSession, product_ids: List[UUID]) -> str:
+        """JSON-массив карточек товаров в порядке списка (отсутствующие пропускаются)"""
+        requested = func.unnest(
+            bindparam("product_ids", product_ids, type_=ARRAY(PG_UUID(as_uuid=True)))
+        ).table_valued(
+            column("product_id", PG_UUID(as_uuid=True)),
+            with_ordinality="position",
+        ).render_derived(name="requested")
+
+        query = select(
+            func.string_agg(document_json, aggregate_order_by(literal_column("','"), requested.c.position))
+        ).select_from(
+            requested
+            .join(ProductDocument, ProductDocument.product_id == requested.c.product_id)
+            .join(Product, Product.id == ProductDocument.product_id)
+        )
+        result = await db.execute(query)
+        return f"[{result.scalar() or ''}]"
+
+    @staticmethod
+    async def get_by_ids(db: AsyncSession, product_ids: List[UUID]) -> List[Product]:
+        """Получить товары по списку ID в порядке списка"""
+        if not product_ids:
+            return []
+        query = select(Product).options(
+            selectinload(Product.images),
+            selectinload(Product.category)
+        ).where(Product.id.in_(product_ids))
+        result = await db.execute(query)
+        products = {product.id: product for product in result.scalars().all()}
+        return [products[product_id] for product_id in product_ids if product_id in products]
+
+    @staticmethod
+    def list_query(filters: ProductFilter) -> tuple[Select, Select]:
+        """Запрос страницы списка товаров и запрос общего количества по фильтрам"""
         # Базовый запрос
         query = select(Product).options(
             selectinload(Product.images),
             selectinload(Product.category)
         )
         
-        # Применение фильтров
+        # Применение фильтров; снятые с производства - только по явному запросу
         conditions = []
+        if filters.status != ProductStatus.DISCONTINUED:
+            conditions.append(is_hot)
         
         if filters.category_id:
             conditions.append(Product.category_id == filters.category_id)
@@ -107,8 +188,6 @@ class ProductCRUD:
         count_query = select(func.count()).select_from(Product)
         if conditions:
             count_query = count_query.where(and_(*conditions))
-        total_result = await db.execute(count_query)
-        total = total_result.scalar()
         
         # Сортировка
         sort_column = getattr(Product, filters.sort_by, Product.created_at)
@@ -121,9 +200,32 @@ class ProductCRUD:
         offset = (filters.page - 1) * filters.page_size
         query = query.offset(offset).limit(filters.page_size)
         
-        result = await db.execute(query)
-        products = result.scalars().all()
-        
+        return query, count_query
+
+    @staticmethod
+    async def get_list(
+        db: AsyncSession,
+        filters: ProductFilter,
+        record_usage: bool = True
+    ) -> tuple[List[Product], int]:
+        """Получить список товаров с фильтрацией и пагинацией
+
+        record_usage=False - внутренний вызов (прогрев), не учитывается в статистике фильтров
+        """
+        started = time.perf_counter()
+        
+        query, count_query = ProductCRUD.list_query(filters)
+        
+        # Набор фильтров попадёт в запись медленного запроса
+        with query_filters(filters.model_dump(mode="json", exclude_defaults=True)):
+            total_result = await db.execute(count_query)
+            total = total_result.scalar()
+            
+            result = await db.execute(query)
+            products = result.scalars().all()
+        
+        if record_usage:
+            filter_usage.record(filters, time.perf_counter() - started)
         return products, total
 
     @staticmethod
@@ -164,6 +266,8 @@ class ProductCRUD:
         if not product:
             return None
         
+        # Рост остатка с нуля и снижение цены ставят задание рассылки по избранному
+        # триггером в этой же транзакции (app/core/notification_fanout.py)
         update_data = product_data.model_dump(exclude_unset=True)
         for field, value in update_data.items():
             setattr(product, field, value)
@@ -185,18 +289,26 @@ class ProductCRUD:
 
     @staticmethod
     async def increment_view_count(db: AsyncSession, product_id: UUID) -> None:
-        """Увеличить счётчик просмотров"""
-        product = await ProductCRUD.get_by_id(db, product_id)
-        if product:
-            product.view_count += 1
-            await db.commit()
+        """Увеличить счётчик просмотров
+
+        updated_at - токен версии товара для оформления заказа, просмотр его не
+        меняет: значение передаётся явно, чтобы не сработал onupdate столбца
+        (триггер update_product_updated_at() тоже его не трогает).
+        """
+        await db.execute(
+            update(Product)
+            .where(Product.id == product_id)
+            .values(view_count=Product.view_count + 1, updated_at=Product.updated_at)
+        )
+        await db.commit()
 
     @staticmethod
     async def get_featured(db: AsyncSession, limit: int = 10) -> List[Product]:
         """Получить избранные товары"""
         query = select(Product).options(
-            selectinload(Product.images)
-        ).where(Product.is_featured == True).limit(limit)
+            selectinload(Product.images),
+            selectinload(Product.category)
+        ).where(Product.is_featured == True, is_hot).limit(limit)
         
         result = await db.execute(query)
         return result.scalars().all()
@@ -205,13 +317,80 @@ class ProductCRUD:
     async def get_new(db: AsyncSession, limit: int = 10) -> List[Product]:
         """Получить новинки"""
         query = select(Product).options(
-            selectinload(Product.images)
-        ).where(Product.is_new == True).order_by(Product.created_at.desc()).limit(limit)
+            selectinload(Product.images),
+            selectinload(Product.category)
+        ).where(Product.is_new == True, is_hot).order_by(Product.created_at.desc()).limit(limit)
         
         result = await db.execute(query)
         return result.scalars().all()
 
+    @staticmethod
+    async def validate_cart(db: AsyncSession, items: List[CartItem]) -> List[tuple]:
+        """Проверить позиции корзины и посчитать итоги одним запросом
+
+        Позиции передаются двумя массивами и разворачиваются через unnest,
+        поэтому форма запроса не зависит от размера корзины. Причины отказа
+        по позиции запрос возвращает массивом кодов errors; итоги считаются
+        оконными суммами только по позициям без ошибок.
+        """
+        cart = func.unnest(
+            bindparam("product_ids", [item.product_id for item in items], type_=ARRAY(PG_UUID(as_uuid=True))),
+            bindparam("quantities", [item.quantity for item in items], type_=ARRAY(Integer)),
+        ).table_valued(
+            column("product_id", PG_UUID(as_uuid=True)),
+            column("quantity", Integer),
+            with_ordinality="line_no",
+        ).render_derived(name="cart")
+
+        # Для ненайденного товара остальные условия дают NULL и в массив не попадают
+        errors = func.array_remove(array([
+            case((condition, code))
+            for code, condition in (
+                ("not_found", Product.id.is_(None)),
+                ("discontinued", Product.status == ProductStatus.DISCONTINUED),
+                ("below_min_quantity", cart.c.quantity < func.coalesce(Product.min_order_quantity, 1)),
+                ("above_max_quantity", cart.c.quantity > Product.max_order_quantity),
+                ("insufficient_stock", and_(
+                    Product.status != ProductStatus.ON_ORDER,
+                    cart.c.quantity > func.coalesce(Product.stock_quantity, 0),
+                )),
+            )
+        ]), null(), type_=ARRAY(Text))
+        is_valid = func.cardinality(errors) == 0
+        line_total = Product.price * cart.c.quantity
+        line_discount = case(
+            (Product.old_price > Product.price, (Product.old_price - Product.price) * cart.c.quantity),
+            else_=0
+        )
+
+        query = select(
+            cart.c.line_no,
+            cart.c.product_id,
+            cart.c.quantity,
+            Product.name,
+            Product.slug,
+            Product.status,
+            Product.price,
+            Product.old_price,
+            Product.stock_quantity,
+            Product.min_order_quantity,
+            Product.max_order_quantity,
+            Product.updated_at,
+            errors.label("errors"),
+            is_valid.label("is_valid"),
+            line_total.label("line_total"),
+            line_discount.label("line_discount"),
+            func.sum(case((is_valid, line_total), else_=0)).over().label("total"),
+            func.sum(case((is_valid, line_discount), else_=0)).over().label("discount"),
+        ).select_from(
+            cart.outerjoin(Product, Product.id == cart.c.product_id)
+        ).order_by(cart.c.line_no)
 
+        result = await db.execute(query)
+        return result.all()
+
+
+@instrument_crud
 class CategoryCRUD:
     """CRUD операции для категорий"""
 
@@ -229,6 +408,15 @@ class CategoryCRUD:
         result = await db.execute(query)
         return result.scalar_one_or_none()
 
+    @staticmethod
+    async def get_current_slug(db: AsyncSession, old_slug: str) -> Optional[str]:
+        """Текущий slug категории, которой раньше принадлежал old_slug"""
+        query = select(Category.slug).join(SlugHistory, SlugHistory.entity_id == Category.id).where(
+            SlugHistory.entity == "category", SlugHistory.slug == old_slug
+        )
+        result = await db.execute(query)
+        return result.scalar_one_or_none()
+
     @staticmethod
     async def get_all(db: AsyncSession, is_active: Optional[bool] = None) -> List[Category]:
         """Получить все категории"""
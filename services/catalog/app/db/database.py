@@ -0,0 +1,27 @@
+"""
+Подключение к базе данных
+"""
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
+
+from app.core.config import settings
+from app.core.metrics import TimedQueuePool
+
+engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_pre_ping=True,
+    poolclass=TimedQueuePool,
+)
+
+async_session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+Base = declarative_base()
+
+
+async def get_db():
+    """Зависимость FastAPI: сессия базы данных на время запроса"""
+    async with async_session_maker() as session:
+        yield session
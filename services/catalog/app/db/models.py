@@ -1,8 +1,8 @@
 """
 Модели базы данных для каталога товаров
 """
-from sqlalchemy import Column, String, Text, Numeric, Integer, Boolean, ForeignKey, DateTime, Enum
-from sqlalchemy.dialects.postgresql import UUID, ENUM
+from sqlalchemy import Column, String, Text, Numeric, Integer, BigInteger, Boolean, ForeignKey, DateTime, Enum
+from sqlalchemy.dialects.postgresql import UUID, ENUM, JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import uuid
@@ -54,7 +54,13 @@ class Product(Base):
     price = Column(Numeric(10, 2), nullable=False)
     old_price = Column(Numeric(10, 2))
     status = Column(
-        ENUM(ProductStatus, name="product_status", create_type=False),
+        # В БД тип хранит значения ('in_stock'), а не имена элементов Enum
+        ENUM(
+            ProductStatus,
+            name="product_status",
+            create_type=False,
+            values_callable=lambda statuses: [status.value for status in statuses],
+        ),
         default=ProductStatus.IN_STOCK
     )
 
@@ -108,4 +114,74 @@ class ProductImage(Base):
     product = relationship("Product", back_populates="images")
 
     def __repr__(self):
-        return f"<ProductImage(product_id='{self.product_id}', is_main={self.is_main})>"
\ No newline at end of file
+        return f"<ProductImage(product_id='{self.product_id}', is_main={self.is_main})>"
+
+
+class ProductDocument(Base):
+    """Готовый JSON карточки товара (заполняется триггерами в БД)"""
+    __tablename__ = "product_documents"
+
+    product_id = Column(UUID(as_uuid=True), ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    document = Column(JSONB, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<ProductDocument(product_id={self.product_id})>"
+
+
+class NotificationFanoutJob(Base):
+    """Задание рассылки уведомлений по избранному (ставится триггером в БД)"""
+    __tablename__ = "notification_fanout_jobs"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    product_id = Column(UUID(as_uuid=True), ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    kind = Column(String(20), nullable=False)  # 'back_in_stock' или 'price_drop'
+    data = Column(JSONB, nullable=False)
+    # Последний обработанный user_id в избранном (keyset-курсор)
+    cursor = Column(UUID(as_uuid=True))
+    notified = Column(Integer, nullable=False, default=0)
+    attempts = Column(Integer, nullable=False, default=0)
+    locked_until = Column(DateTime(timezone=True))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True))
+
+    def __repr__(self):
+        return f"<NotificationFanoutJob(id={self.id}, kind='{self.kind}', product_id={self.product_id})>"
+
+
+class SlugHistory(Base):
+    """Прежний slug товара или категории (заполняется триггером в БД)"""
+    __tablename__ = "slug_history"
+
+    entity = Column(String(20), primary_key=True)  # 'product' или 'category'
+    slug = Column(String(255), primary_key=True)
+    entity_id = Column(UUID(as_uuid=True), nullable=False)
+    changed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<SlugHistory(entity='{self.entity}', slug='{self.slug}', entity_id={self.entity_id})>"
+
+
+class CatalogChange(Base):
+    """Запись ленты изменений каталога (заполняется триггерами в БД)"""
+    __tablename__ = "catalog_changes"
+
+    seq = Column(BigInteger, primary_key=True, autoincrement=True)
+    entity = Column(String(20), nullable=False)
+    op = Column(String(10), nullable=False)
+    entity_id = Column(UUID(as_uuid=True), nullable=False)
+    data = Column(JSONB)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+    def as_event(self) -> dict:
+        """Событие в том же виде, что и полезная нагрузка NOTIFY"""
+        return {
+            "seq": self.seq,
+            "entity": self.entity,
+            "op": self.op,
+            "id": str(self.entity_id),
+            "data": self.data,
+        }
+
+    def __repr__(self):
+        return f"<CatalogChange(seq={self.seq}, entity='{self.entity}', op='{self.op}')>"
@@ -0,0 +1,240 @@
+"""
+Помощники онлайн-миграций Alembic
+
+Изменения схемы на работающей базе без долгих блокировок:
+
+- индексы создаются и удаляются CONCURRENTLY вне транзакции миграции
+  (autocommit_block) без lock_timeout, недостроенный INVALID-индекс после
+  сбоя пересоздаётся;
+- ADD COLUMN выполняется отдельной короткой транзакцией с lock_timeout
+  и повторяется, если блокировку не удалось получить сразу;
+- заполнение столбцов идёт пачками по первичному ключу, каждая пачка -
+  своя транзакция, с паузой между пачками и отчётом о прогрессе; так же
+  пачками вызывается функция для каждой строки (call_in_batches).
+
+Пример миграции:
+
+    from app.db.online_migrations import add_column, backfill, create_index_concurrently
+
+    def upgrade():
+        add_column("products", sa.Column("search_rank", sa.Integer(), nullable=True))
+        backfill("products", "search_rank = review_count * 10", "search_rank IS NULL")
+        create_index_concurrently("idx_products_search_rank", "products", ["search_rank"])
+"""
+import logging
+import time
+from contextlib import contextmanager
+from typing import Optional, Sequence, Union
+
+import sqlalchemy as sa
+from alembic import context, op
+from sqlalchemy.exc import OperationalError
+
+from app.core.config import settings
+
+logger = logging.getLogger("alembic.online")
+
+# SQLSTATE lock_not_available: истёк lock_timeout
+LOCK_NOT_AVAILABLE = "55P03"
+
+
+def _is_lock_timeout(exc: OperationalError) -> bool:
+    return getattr(exc.orig, "pgcode", None) == LOCK_NOT_AVAILABLE
+
+
+def _with_lock_retry(action, description: str) -> None:
+    """Выполнить DDL, повторяя при истечении lock_timeout"""
+    attempts = settings.MIGRATION_LOCK_RETRIES
+    for attempt in range(1, attempts + 1):
+        try:
+            action()
+            return
+        except OperationalError as exc:
+            if not _is_lock_timeout(exc) or attempt == attempts:
+                raise
+            delay = settings.MIGRATION_LOCK_RETRY_DELAY_SECONDS * attempt
+            logger.warning("%s: блокировка занята, попытка %s/%s через %.1f с", description, attempt, attempts, delay)
+            time.sleep(delay)
+
+
+def _index_is_invalid(name: str) -> bool:
+    """Индекс остался INVALID после прерванного CREATE INDEX CONCURRENTLY"""
+    result = op.get_bind().execute(
+        sa.text(
+            "SELECT NOT i.indisvalid FROM pg_index i "
+            "JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name"
+        ),
+        {"name": name},
+    )
+    return bool(result.scalar())
+
+
+@contextmanager
+def _without_lock_timeout():
+    """Снять lock_timeout сессии на время CREATE/DROP INDEX CONCURRENTLY
+
+    CONCURRENTLY ждёт завершения всех более старых транзакций, и это ожидание
+    тоже ограничено lock_timeout: любая транзакция длиннее таймаута обрывала бы
+    построение и оставляла INVALID-индекс. Таблицу такое ожидание не блокирует.
+    """
+    op.execute("SET lock_timeout = 0")
+    try:
+        yield
+    finally:
+        op.execute(f"SET lock_timeout = {int(settings.MIGRATION_LOCK_TIMEOUT_MS)}")
+
+
+def create_index_concurrently(
+    name: str,
+    table: str,
+    columns: Sequence[Union[str, sa.TextClause]],
+    **kwargs,
+) -> None:
+    """CREATE INDEX CONCURRENTLY IF NOT EXISTS вне транзакции миграции
+
+    kwargs передаются в op.create_index: postgresql_using, postgresql_ops,
+    postgresql_where, unique.
+    """
+    with context.get_context().autocommit_block(), _without_lock_timeout():
+        if not context.is_offline_mode() and _index_is_invalid(name):
+            logger.warning("Индекс %s недостроен (INVALID), пересоздаётся", name)
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+        started = time.monotonic()
+        op.create_index(name, table, list(columns), postgresql_concurrently=True, if_not_exists=True, **kwargs)
+        if not context.is_offline_mode():
+            logger.info("Индекс %s построен за %.1f с", name, time.monotonic() - started)
+
+
+def drop_index_concurrently(name: str, table: str) -> None:
+    """DROP INDEX CONCURRENTLY IF EXISTS вне транзакции миграции"""
+    with context.get_context().autocommit_block(), _without_lock_timeout():
+        op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+
+
+def add_column(table: str, column: sa.Column) -> None:
+    """ADD COLUMN короткой отдельной транзакцией
+
+    Без DEFAULT или с константным DEFAULT PostgreSQL не переписывает таблицу,
+    но ждёт ACCESS EXCLUSIVE, а пока ждёт - блокирует всех за собой. lock_timeout
+    ограничивает это ожидание, а неудачная попытка повторяется.
+    """
+    with context.get_context().autocommit_block():
+        _with_lock_retry(lambda: op.add_column(table, column), f"ADD COLUMN {table}.{column.name}")
+
+
+def backfill(
+    table: str,
+    assignments: str,
+    pending: str,
+    batch_size: Optional[int] = None,
+    pause: Optional[float] = None,
+    key: str = "id",
+) -> int:
+    """Заполнить столбцы пачками; возвращает число обновлённых строк
+
+    assignments - SET-часть UPDATE, pending - условие строк, которые ещё не
+    заполнены (по нему миграция продолжается после прерывания). Строки,
+    заблокированные другими транзакциями, пропускаются (SKIP LOCKED) и
+    обрабатываются на следующих проходах, поэтому оформление заказа не ждёт
+    миграцию. Триггеры таблицы срабатывают на каждую строку: для products это
+    лента изменений и пересборка документов товаров.
+    """
+    batch_size = batch_size or settings.MIGRATION_BACKFILL_BATCH_SIZE
+    pause = settings.MIGRATION_BACKFILL_PAUSE_SECONDS if pause is None else pause
+
+    if context.is_offline_mode():
+        # В SQL-скрипт пачки не развернуть: одна команда для проверки
+        op.execute(f"UPDATE {table} SET {assignments} WHERE {pending}")
+        return 0
+
+    update_batch = sa.text(
+        f"WITH batch AS ("
+        f"SELECT {key} FROM {table} WHERE {pending} LIMIT :batch_size FOR UPDATE SKIP LOCKED"
+        f") UPDATE {table} SET {assignments} FROM batch WHERE {table}.{key} = batch.{key}"
+    )
+    has_pending = sa.text(f"SELECT EXISTS (SELECT 1 FROM {table} WHERE {pending})")
+
+    with context.get_context().autocommit_block():
+        connection = op.get_bind()
+        total = connection.execute(sa.text(f"SELECT count(*) FROM {table} WHERE {pending}")).scalar()
+        logger.info("Заполнение %s: %s строк, пачки по %s", table, total, batch_size)
+
+        done = 0
+        started = last_report = time.monotonic()
+        while True:
+            updated = connection.execute(update_batch, {"batch_size": batch_size}).rowcount
+            done += updated
+            if updated == 0:
+                # Остались только заблокированные строки или работа закончена
+                if not connection.execute(has_pending).scalar():
+                    break
+            elif time.monotonic() - last_report >= settings.MIGRATION_PROGRESS_SECONDS:
+                last_report = time.monotonic()
+                rate = done / (last_report - started)
+                remaining = max(total - done, 0) / rate if rate else 0
+                logger.info(
+                    "Заполнение %s: %s/%s (%.0f%%), %.0f строк/с, осталось ~%.0f с",
+                    table, done, total, done / total * 100 if total else 100, rate, remaining,
+                )
+            time.sleep(pause)
+
+        logger.info("Заполнение %s завершено: %s строк за %.1f с", table, done, time.monotonic() - started)
+    return done
+
+
+def call_in_batches(
+    table: str,
+    function: str,
+    key: str = "id",
+    batch_size: Optional[int] = None,
+    pause: Optional[float] = None,
+) -> int:
+    """Вызвать SQL-функцию function(key) для каждой строки пачками; возвращает число строк
+
+    Нужна, когда заполнение - не UPDATE столбца, а, например, пересборка
+    производной таблицы. Строки обходятся по возрастанию key, каждая пачка -
+    своя транзакция.
+    """
+    batch_size = batch_size or settings.MIGRATION_BACKFILL_BATCH_SIZE
+    pause = settings.MIGRATION_BACKFILL_PAUSE_SECONDS if pause is None else pause
+
+    if context.is_offline_mode():
+        op.execute(f"SELECT {function}({key}) FROM {table}")
+        return 0
+
+    first_batch = sa.text(
+        f"SELECT {key}, {function}({key}) FROM "
+        f"(SELECT {key} FROM {table} ORDER BY {key} LIMIT :batch_size) batch ORDER BY {key}"
+    )
+    next_batch = sa.text(
+        f"SELECT {key}, {function}({key}) FROM "
+        f"(SELECT {key} FROM {table} WHERE {key} > :after ORDER BY {key} LIMIT :batch_size) batch ORDER BY {key}"
+    )
+
+    with context.get_context().autocommit_block():
+        connection = op.get_bind()
+        total = connection.execute(sa.text(f"SELECT count(*) FROM {table}")).scalar()
+        logger.info("%s для %s: %s строк, пачки по %s", function, table, total, batch_size)
+
+        done = 0
+        after = None
+        started = last_report = time.monotonic()
+        while True:
+            if after is None:
+                rows = connection.execute(first_batch, {"batch_size": batch_size}).all()
+            else:
+                rows = connection.execute(next_batch, {"batch_size": batch_size, "after": after}).all()
+            if not rows:
+                break
+            done += len(rows)
+            after = rows[-1][0]
+            if time.monotonic() - last_report >= settings.MIGRATION_PROGRESS_SECONDS:
+                last_report = time.monotonic()
+                logger.info(
+                    "%s для %s: %s/%s (%.0f%%)",
+                    function, table, done, total, done / total * 100 if total else 100,
+                )
+            time.sleep(pause)
+
+        logger.info("%s для %s завершено: %s строк за %.1f с", function, table, done, time.monotonic() - started)
+    return done
@@ -0,0 +1,200 @@
+"""
+Индекс похожих товаров
+
+Характеристики товаров (цена, длина клинка, вес, назначение, сталь, категория)
+векторизуются в матрицу NumPy: числовые признаки нормализуются, категориальные
+кодируются one-hot с весом. Запрос top-k - один проход по матрице в памяти
+без обращения к БД. Индекс обновляется точечно по событиям ленты изменений.
+"""
+import math
+import logging
+from typing import Optional
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.database import async_session_maker
+from app.db.models import Product, ProductStatus
+
+logger = logging.getLogger(__name__)
+
+# Веса признаков: чем больше вес, тем сильнее расхождение по признаку
+# отдаляет товары друг от друга
+NUMERIC_WEIGHTS = {
+    "price": 1.0,
+    "blade_length": 1.5,
+    "weight": 1.0,
+}
+CATEGORICAL_WEIGHTS = {
+    "purpose": 2.0,
+    "blade_material": 1.5,
+    "category_id": 1.5,
+}
+
+FEATURE_COLUMNS = (
+    Product.id,
+    Product.status,
+    Product.category_id,
+    Product.price,
+    Product.blade_length,
+    Product.weight,
+    Product.blade_material,
+    Product.purpose,
+)
+
+
+def _numeric(row, field: str) -> float:
+    value = getattr(row, field)
+    if value is None:
+        return math.nan
+    value = float(value)
+    # Цены распределены логарифмически: разница 1000 и 2000 важнее, чем 20000 и 21000
+    return math.log1p(value) if field == "price" else value
+
+
+def _categorical(row, field: str) -> Optional[str]:
+    value = getattr(row, field)
+    if value is None:
+        return None
+    value = str(value).strip().casefold()
+    return value or None
+
+
+class SimilarProductsIndex:
+    """Индекс ближайших соседей по характеристикам товаров"""
+
+    def __init__(self):
+        self._ids: list[UUID] = []
+        self._positions: dict[UUID, int] = {}
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._active = np.zeros(0, dtype=bool)
+        self._mean: dict[str, float] = {}
+        self._std: dict[str, float] = {}
+        self._vocabulary: dict[str, dict[str, int]] = {}
+        self._dimensions = 0
+
+    def __contains__(self, product_id: UUID) -> bool:
+        return product_id in self._positions
+
+    @property
+    def is_built(self) -> bool:
+        """Индекс построен (после rebuild есть хотя бы числовые признаки)"""
+        return self._dimensions > 0
+
+    def _vectorize(self, row) -> Optional[np.ndarray]:
+        """Вектор признаков товара; None, если встретилось значение вне словаря"""
+        vector = np.zeros(self._dimensions, dtype=np.float32)
+        offset = 0
+        for field, weight in NUMERIC_WEIGHTS.items():
+            value = _numeric(row, field)
+            # Отсутствующая характеристика считается средней
+            if not math.isnan(value):
+                vector[offset] = weight * (value - self._mean[field]) / self._std[field]
+            offset += 1
+        for field, weight in CATEGORICAL_WEIGHTS.items():
+            value = _categorical(row, field)
+            if value is not None:
+                column = self._vocabulary[field].get(value)
+                if column is None:
+                    return None
+                vector[column] = weight
+        return vector
+
+    async def rebuild(self, db: AsyncSession) -> None:
+        """Полностью перестроить индекс по всем товарам"""
+        rows = (await db.execute(select(*FEATURE_COLUMNS))).all()
+
+        mean, std = {}, {}
+        for field in NUMERIC_WEIGHTS:
+            values = np.array([_numeric(row, field) for row in rows], dtype=np.float64)
+            values = values[~np.isnan(values)]
+            mean[field] = float(values.mean()) if values.size else 0.0
+            std[field] = float(values.std()) if values.size and values.std() > 0 else 1.0
+
+        vocabulary: dict[str, dict[str, int]] = {}
+        column = len(NUMERIC_WEIGHTS)
+        for field in CATEGORICAL_WEIGHTS:
+            vocabulary[field] = {}
+            for value in sorted({_categorical(row, field) for row in rows} - {None}):
+                vocabulary[field][value] = column
+                column += 1
+
+        # Новое состояние собирается целиком и подменяет старое одним присваиванием
+        builder = SimilarProductsIndex()
+        builder._mean, builder._std = mean, std
+        builder._vocabulary, builder._dimensions = vocabulary, column
+        matrix = np.zeros((len(rows), column), dtype=np.float32)
+        for position, row in enumerate(rows):
+            matrix[position] = builder._vectorize(row)
+
+        self._mean, self._std = mean, std
+        self._vocabulary, self._dimensions = vocabulary, column
+        self._matrix = matrix
+        self._active = np.array([row.status != ProductStatus.DISCONTINUED for row in rows], dtype=bool)
+        self._ids = [row.id for row in rows]
+        self._positions = {product_id: position for position, product_id in enumerate(self._ids)}
+        logger.info("Индекс похожих товаров перестроен: %s товаров, %s признаков", len(rows), column)
+
+    async def refresh_product(self, db: AsyncSession, product_id: UUID) -> None:
+        """Обновить в индексе один товар после его изменения"""
+        if not self._dimensions:
+            # Индекс ещё не построен: товар попадёт в него при первом rebuild
+            return
+
+        row = (await db.execute(select(*FEATURE_COLUMNS).where(Product.id == product_id))).one_or_none()
+        position = self._positions.get(product_id)
+
+        if row is None:
+            if position is not None:
+                self._active[position] = False
+            return
+
+        vector = self._vectorize(row)
+        if vector is None:
+            # Новое назначение, сталь или категория: меняется размерность признаков
+            await self.rebuild(db)
+            return
+
+        active = row.status != ProductStatus.DISCONTINUED
+        if position is None:
+            self._matrix = np.vstack([self._matrix, vector])
+            self._active = np.append(self._active, active)
+            self._positions[product_id] = len(self._ids)
+            self._ids.append(product_id)
+        else:
+            self._matrix[position] = vector
+            self._active[position] = active
+
+    def similar(self, product_id: UUID, limit: int) -> list[UUID]:
+        """ID ближайших к товару активных товаров, от самого похожего"""
+        position = self._positions.get(product_id)
+        if position is None:
+            return []
+
+        diff = self._matrix - self._matrix[position]
+        distances = np.einsum("ij,ij->i", diff, diff)
+        distances[~self._active] = np.inf
+        distances[position] = np.inf
+
+        candidates = int(np.count_nonzero(np.isfinite(distances)))
+        limit = min(limit, candidates)
+        if limit == 0:
+            return []
+
+        nearest = np.argpartition(distances, limit - 1)[:limit]
+        nearest = nearest[np.argsort(distances[nearest])]
+        return [self._ids[i] for i in nearest]
+
+
+similar_index = SimilarProductsIndex()
+
+
+async def apply_change(event: dict) -> None:
+    """Слушатель ленты изменений: обновить индекс после изменения каталога"""
+    async with async_session_maker() as db:
+        if event["entity"] == "product":
+            await similar_index.refresh_product(db, UUID(event["id"]))
+        elif event["op"] == "resync":
+            await similar_index.rebuild(db)
@@ -0,0 +1,139 @@
+"""
+Карта slug товаров и категорий
+
+Живые slug отображаются в ID, поэтому маршруты /slug/{slug} сразу идут по
+быстрому пути по ID (документ товара из кэша, категория по первичному ключу).
+Прежние slug из slug_history (их пишет триггер при смене slug) ведут на
+текущий адрес: ответ 301 отдаётся из памяти, без запроса к БД. Карта
+загружается при прогреве и обновляется по событиям ленты изменений: slug
+приходит в данных события, поэтому обновление тоже обходится без БД. Если
+slug в карте нет (карта ещё не загружена или событие не пришло), маршруты
+ищут его в products и slug_history.
+"""
+import asyncio
+import logging
+import sys
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.database import async_session_maker
+from app.db.models import Product, Category, SlugHistory
+
+logger = logging.getLogger(__name__)
+
+
+class SlugMap:
+    """slug -> ID для одной сущности с историей прежних slug"""
+
+    def __init__(self):
+        self._ids: dict[str, UUID] = {}
+        self._slugs: dict[UUID, str] = {}
+        self._history: dict[str, UUID] = {}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def load(self, rows, history) -> None:
+        """Заменить карту целиком: rows - (id, slug), history - (slug, id)"""
+        ids = {sys.intern(slug): entity_id for entity_id, slug in rows}
+        self._ids = ids
+        self._slugs = {entity_id: slug for slug, entity_id in ids.items()}
+        self._history = {slug: entity_id for slug, entity_id in history if slug not in ids}
+
+    def resolve(self, slug: str) -> Optional[UUID]:
+        """ID записи с этим живым slug"""
+        return self._ids.get(slug)
+
+    def redirect(self, slug: str) -> Optional[str]:
+        """Текущий slug записи, которой раньше принадлежал slug"""
+        entity_id = self._history.get(slug)
+        return self._slugs.get(entity_id) if entity_id else None
+
+    def set(self, entity_id: UUID, slug: str) -> None:
+        """Запись создана или изменена; как триггер, переносит прежний slug в историю
+
+        События разных записей могут прийти не в порядке фиксации: прежний slug
+        мог уже достаться другой записи. Тогда он остаётся за ней.
+        """
+        previous = self._slugs.get(entity_id)
+        if previous == slug:
+            return
+        if previous is not None and self._ids.get(previous) == entity_id:
+            self._ids.pop(previous)
+            self._history[previous] = entity_id
+        self._history.pop(slug, None)
+        slug = sys.intern(slug)
+        self._ids[slug] = entity_id
+        self._slugs[entity_id] = slug
+
+    def remove(self, entity_id: UUID) -> None:
+        """Запись удалена вместе с её историей"""
+        slug = self._slugs.pop(entity_id, None)
+        if slug is not None and self._ids.get(slug) == entity_id:
+            self._ids.pop(slug)
+        self._history = {old: owner for old, owner in self._history.items() if owner != entity_id}
+
+
+class SlugIndex:
+    """Карты slug товаров и категорий"""
+
+    def __init__(self):
+        self.products = SlugMap()
+        self.categories = SlugMap()
+        self._rebuild_task: Optional[asyncio.Task] = None
+        # Перестройку запросили во время перестройки: её снимок мог устареть
+        self._rebuild_pending = False
+
+    def map_for(self, entity: str) -> SlugMap:
+        return self.products if entity == "product" else self.categories
+
+    async def rebuild(self, db: AsyncSession) -> None:
+        """Перечитать slug и историю из БД"""
+        history = (await db.execute(select(SlugHistory.entity, SlugHistory.slug, SlugHistory.entity_id))).all()
+        for entity, model in (("product", Product), ("category", Category)):
+            rows = (await db.execute(select(model.id, model.slug))).all()
+            self.map_for(entity).load(
+                rows,
+                [(row.slug, row.entity_id) for row in history if row.entity == entity],
+            )
+        logger.info(
+            "Карта slug перестроена: %s товаров, %s категорий, %s прежних slug",
+            len(self.products), len(self.categories), len(history),
+        )
+
+    def apply(self, event: dict) -> None:
+        """Применить событие об изменении товара или категории"""
+        slugs = self.map_for(event["entity"])
+        entity_id = UUID(event["id"])
+        if event["op"] == "delete":
+            slugs.remove(entity_id)
+        else:
+            slugs.set(entity_id, event["data"]["slug"])
+
+    def schedule_rebuild(self) -> None:
+        self._rebuild_pending = True
+        if self._rebuild_task is None or self._rebuild_task.done():
+            self._rebuild_task = asyncio.create_task(self._rebuild())
+
+    async def _rebuild(self) -> None:
+        while self._rebuild_pending:
+            self._rebuild_pending = False
+            try:
+                async with async_session_maker() as db:
+                    await self.rebuild(db)
+            except Exception:
+                logger.exception("Не удалось перестроить карту slug")
+
+
+slug_index = SlugIndex()
+
+
+async def apply_change(event: dict) -> None:
+    """Слушатель ленты изменений: обновить карту slug"""
+    if event["entity"] in ("product", "category"):
+        slug_index.apply(event)
+    elif event["op"] == "resync":
+        slug_index.schedule_rebuild()
@@ -0,0 +1,179 @@
+"""
+Индекс автодополнения поиска
+
+Отсортированный массив нормализованных ключей (названия товаров и категорий,
+материалы клинка, назначения) с поиском префикса через bisect. Для коротких
+префиксов (1-3 символа), где диапазон совпадений велик, лучшие подсказки
+вычисляются заранее. Нормализация: casefold и замена «ё» на «е», поэтому
+«ЁЛКА», «елка» и «Ёлка» совпадают.
+"""
+import asyncio
+import logging
+import math
+import re
+from bisect import bisect_left
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.database import async_session_maker
+from app.db.models import Product, Category, ProductStatus
+
+logger = logging.getLogger(__name__)
+
+# Базовый вес подсказки по типу: категории выше отдельных товаров
+KIND_WEIGHTS = {
+    "category": 4.0,
+    "purpose": 3.0,
+    "material": 2.5,
+    "product": 2.0,
+}
+
+# Совпадение не с начала строки, а с начала второго и следующих слов
+WORD_MATCH_PENALTY = 1.0
+
+# Точное совпадение ключа с запросом выше его продолжения
+EXACT_MATCH_BONUS = 1.0
+
+# Длина префикса, для которого подсказки вычисляются заранее
+SHORT_PREFIX_LENGTH = 3
+
+# Максимум подсказок в ответе
+MAX_SUGGESTIONS = 20
+
+_separators = re.compile(r"[^\w]+")
+
+
+def normalize(value: str) -> str:
+    """Привести строку к виду для сравнения: регистр, «ё», лишние разделители"""
+    value = value.casefold().replace("ё", "е")
+    return " ".join(_separators.sub(" ", value).split())
+
+
+class SuggestIndex:
+    """Префиксный индекс подсказок поиска"""
+
+    def __init__(self):
+        self._keys: list[str] = []
+        self._refs: list[tuple[int, float]] = []
+        self._suggestions: list[dict] = []
+        self._short: dict[str, list[int]] = {}
+        self._rebuild_task: Optional[asyncio.Task] = None
+        # Изменение пришло во время перестройки: её снимок мог его не увидеть
+        self._rebuild_pending = False
+
+    async def rebuild(self, db: AsyncSession) -> None:
+        """Перестроить индекс по текущему каталогу"""
+        products = (await db.execute(
+            select(
+                Product.id, Product.name, Product.slug, Product.blade_material,
+                Product.purpose, Product.view_count
+            ).where(Product.status != ProductStatus.DISCONTINUED)
+        )).all()
+        categories = (await db.execute(
+            select(Category.id, Category.name, Category.slug).where(Category.is_active == True)
+        )).all()
+
+        suggestions: list[dict] = []
+        scores: list[float] = []
+
+        def add(text: str, kind: str, score: float, **extra) -> None:
+            suggestions.append({"text": text, "kind": kind, **extra})
+            scores.append(KIND_WEIGHTS[kind] + score)
+
+        for category in categories:
+            add(category.name, "category", 0.0, id=category.id, slug=category.slug)
+
+        # Материалы и назначения: одна подсказка на значение, вес по числу товаров
+        for field, kind in (("blade_material", "material"), ("purpose", "purpose")):
+            counts: dict[str, tuple[str, int]] = {}
+            for product in products:
+                value = getattr(product, field)
+                if not value or not normalize(value):
+                    continue
+                text, count = counts.get(normalize(value), (value.strip(), 0))
+                counts[normalize(value)] = (text, count + 1)
+            for text, count in counts.values():
+                add(text, kind, math.log1p(count))
+
+        for product in products:
+            add(product.name, "product", math.log1p(product.view_count or 0) / 10, id=product.id, slug=product.slug)
+
+        # Ключи: вся строка и каждый её суффикс с начала слова
+        entries: list[tuple[str, int, float]] = []
+        for ref, suggestion in enumerate(suggestions):
+            words = normalize(suggestion["text"]).split()
+            for position in range(len(words)):
+                penalty = WORD_MATCH_PENALTY if position else 0.0
+                entries.append((" ".join(words[position:]), ref, scores[ref] - penalty))
+        entries.sort(key=lambda entry: entry[0])
+
+        short: dict[str, dict[int, float]] = {}
+        for key, ref, score in entries:
+            for length in range(1, SHORT_PREFIX_LENGTH + 1):
+                if len(key) < length:
+                    break
+                # Тот же бонус точного совпадения, что и при поиске через bisect
+                prefix_score = score + EXACT_MATCH_BONUS if len(key) == length else score
+                best = short.setdefault(key[:length], {})
+                best[ref] = max(best.get(ref, prefix_score), prefix_score)
+
+        self._keys = [key for key, _, _ in entries]
+        self._refs = [(ref, score) for _, ref, score in entries]
+        self._suggestions = suggestions
+        self._short = {
+            prefix: sorted(best, key=best.get, reverse=True)[:MAX_SUGGESTIONS]
+            for prefix, best in short.items()
+        }
+        logger.info("Индекс подсказок перестроен: %s подсказок, %s ключей", len(suggestions), len(entries))
+
+    def suggest(self, query: str, limit: int = 10) -> list[dict]:
+        """Подсказки для префикса, от более релевантных к менее"""
+        prefix = normalize(query)
+        if not prefix:
+            return []
+
+        if len(prefix) <= SHORT_PREFIX_LENGTH and prefix in self._short:
+            return [self._suggestions[ref] for ref in self._short[prefix][:limit]]
+
+        start = bisect_left(self._keys, prefix)
+        best: dict[int, float] = {}
+        for position in range(start, len(self._keys)):
+            if not self._keys[position].startswith(prefix):
+                break
+            ref, score = self._refs[position]
+            # Точное совпадение выше продолжения
+            if len(self._keys[position]) == len(prefix):
+                score += EXACT_MATCH_BONUS
+            if score > best.get(ref, -math.inf):
+                best[ref] = score
+
+        ranked = sorted(best, key=best.get, reverse=True)[:limit]
+        return [self._suggestions[ref] for ref in ranked]
+
+    def schedule_rebuild(self) -> None:
+        """Перестроить индекс с задержкой, объединяя серию изменений в одну перестройку"""
+        self._rebuild_pending = True
+        if self._rebuild_task is None or self._rebuild_task.done():
+            self._rebuild_task = asyncio.create_task(self._delayed_rebuild())
+
+    async def _delayed_rebuild(self) -> None:
+        # Пока во время перестройки приходят изменения - ещё одна перестройка
+        while self._rebuild_pending:
+            await asyncio.sleep(settings.SUGGEST_REBUILD_DELAY_SECONDS)
+            self._rebuild_pending = False
+            try:
+                async with async_session_maker() as db:
+                    await self.rebuild(db)
+            except Exception:
+                logger.exception("Не удалось перестроить индекс подсказок")
+
+
+suggest_index = SuggestIndex()
+
+
+async def apply_change(event: dict) -> None:
+    """Слушатель ленты изменений: перестроить индекс после изменения каталога"""
+    suggest_index.schedule_rebuild()
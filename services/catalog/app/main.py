@@ -2,13 +2,25 @@
 Микросервис каталога товаров
 Управление товарами, категориями, фильтрация и поиск
 """
-from fastapi import FastAPI
+import asyncio
+
+from fastapi import FastAPI, status
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.gzip import GZipMiddleware
-from prometheus_fastapi_instrumentator import Instrumentator
+from prometheus_fastapi_instrumentator import Instrumentator, metrics
 
 from app.core.config import settings
 from app.api.v1 import api_router
+from app.core.warmup import readiness, warm_up
+from app.core.limiter import ConcurrencyLimitMiddleware
+from app.core.slow_queries import slow_query_recorder
+from app.core.filter_stats import filter_usage
+from app.core.metrics import response_size
+from app.core import notification_fanout as fanout
+from app.core.cache import NegotiatingGZipMiddleware, response_cache
+from app.core.change_feed import change_feed
+from app.indexes import similar, suggest, slugs
+from app.db.database import engine
 
 app = FastAPI(
     title="Knife Store - Catalog Service",
@@ -18,6 +30,13 @@ app = FastAPI(
     redoc_url="/redoc",
 )
 
+# Запись медленных запросов
+slow_query_recorder.install(engine)
+
+# Ограничение параллельности запросов к БД (внутренний слой: ответы 503 проходят через CORS)
+if settings.LIMITER_ENABLED:
+    app.add_middleware(ConcurrencyLimitMiddleware)
+
 # Middleware для CORS
 app.add_middleware(
     CORSMiddleware,
@@ -27,11 +46,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Middleware для сжатия ответов
-app.add_middleware(GZipMiddleware, minimum_size=1000)
+# Middleware для сжатия ответов на лету с учётом q в Accept-Encoding; кэшированные
+# ответы уже сжаты заранее (app.core.cache) и проходят мимо по заголовку Content-Encoding
+app.add_middleware(
+    NegotiatingGZipMiddleware,
+    minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+    compresslevel=settings.COMPRESSION_GZIP_LEVEL,
+)
 
-# Prometheus метрики
-Instrumentator().instrument(app).expose(app)
+# Prometheus метрики; при PROMETHEUS_MULTIPROC_DIR /metrics суммирует все воркеры
+instrumentator = Instrumentator(excluded_handlers=["/metrics"])
+instrumentator.add(metrics.default())
+instrumentator.add(response_size)
+instrumentator.instrument(app).expose(app)
 
 # Подключение роутеров
 app.include_router(api_router, prefix="/api/v1")
@@ -48,21 +75,68 @@ async def root():
 
 
 @app.get("/health")
+@app.get("/health/live")
 async def health_check():
-    """Проверка здоровья сервиса"""
+    """Проверка живости процесса (без обращения к зависимостям)"""
     return {
         "status": "healthy",
         "service": "catalog-service"
     }
 
 
+@app.get("/health/ready")
+async def readiness_check():
+    """Проверка готовности принимать трафик: прогрев завершён и зависимости доступны"""
+    checks = await readiness.dependencies()
+    ready = readiness.warmed_up and all(checks.values())
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={
+            "status": "ready" if ready else "not_ready",
+            "service": "catalog-service",
+            "warmed_up": readiness.warmed_up,
+            "warmup_error": readiness.warmup_error,
+            "checks": checks,
+        },
+    )
+
+
+async def invalidate_response_cache(event: dict) -> None:
+    """Сбросить кэш ответов при изменении каталога (в том числе из других воркеров и админки)"""
+    if event["entity"] == "product":
+        response_cache.invalidate("featured:", "new:", f"product:{event['id']}")
+    elif event["entity"] == "category":
+        # Название и slug категории входят в карточки и списки товаров
+        response_cache.invalidate("categories:", "product:", "featured:", "new:")
+    else:
+        response_cache.invalidate()
+
+
 @app.on_event("startup")
 async def startup_event():
     """Действия при запуске приложения"""
     print("🚀 Catalog Service starting...")
+    change_feed.add_listener(invalidate_response_cache)
+    change_feed.add_listener(similar.apply_change)
+    change_feed.add_listener(suggest.apply_change)
+    change_feed.add_listener(slugs.apply_change)
+    if settings.FANOUT_ENABLED:
+        change_feed.add_listener(fanout.apply_change)
+        await fanout.notification_fanout.start()
+    await change_feed.start()
+    await slow_query_recorder.start()
+    await filter_usage.start()
+    # Прогрев идёт в фоне: /health/live отвечает сразу, /health/ready - после прогрева
+    app.state.warmup_task = asyncio.create_task(warm_up())
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Действия при остановке приложения"""
-    print("👋 Catalog Service shutting down...")
\ No newline at end of file
+    print("👋 Catalog Service shutting down...")
+    app.state.warmup_task.cancel()
+    await change_feed.stop()
+    await slow_query_recorder.stop()
+    await filter_usage.stop()
+    await fanout.notification_fanout.stop()
+    await engine.dispose()
\ No newline at end of file
@@ -0,0 +1,64 @@
+"""
+Pydantic схемы проверки корзины
+"""
+from pydantic import BaseModel, Field, UUID4, field_validator
+from typing import Optional, List
+from datetime import datetime
+from decimal import Decimal
+
+from app.db.models import ProductStatus
+
+
+class CartItem(BaseModel):
+    """Позиция корзины"""
+    product_id: UUID4
+    quantity: int = Field(..., ge=1)
+
+
+class CartValidationRequest(BaseModel):
+    """Запрос проверки корзины"""
+    items: List[CartItem] = Field(..., min_length=1, max_length=100)
+
+    @field_validator("items")
+    @classmethod
+    def unique_products(cls, items: List[CartItem]) -> List[CartItem]:
+        product_ids = [item.product_id for item in items]
+        if len(set(product_ids)) != len(product_ids):
+            raise ValueError("Товар не может встречаться в корзине дважды")
+        return items
+
+
+class CartLineVerdict(BaseModel):
+    """Результат проверки позиции корзины"""
+    line: int
+    product_id: UUID4
+    quantity: int
+    is_valid: bool
+    errors: List[str] = []
+    # not_found, discontinued, below_min_quantity, above_max_quantity, insufficient_stock
+    error_codes: List[str] = []
+
+    name: Optional[str] = None
+    slug: Optional[str] = None
+    status: Optional[ProductStatus] = None
+    unit_price: Optional[Decimal] = None
+    old_price: Optional[Decimal] = None
+    line_total: Decimal = Decimal("0")
+    line_discount: Decimal = Decimal("0")
+    available_quantity: Optional[int] = None
+
+    # Поля для order_items
+    is_custom_order: bool = False
+    estimated_delivery_days: Optional[int] = None
+
+    # Токен версии для оптимистичного оформления: updated_at товара (просмотры его не меняют)
+    version: Optional[datetime] = None
+
+
+class CartValidationResponse(BaseModel):
+    """Результат проверки корзины"""
+    items: List[CartLineVerdict]
+    is_valid: bool
+    subtotal: Decimal  # по старым ценам, если они выше текущих
+    discount: Decimal  # экономия относительно старых цен
+    total: Decimal
@@ -1,7 +1,7 @@
 """
 Pydantic схемы для валидации данных товаров
 """
-from pydantic import BaseModel, Field, UUID4, HttpUrl
+from pydantic import BaseModel, Field, UUID4, HttpUrl, condecimal
 from typing import Optional, List
 from datetime import datetime
 from decimal import Decimal
@@ -79,14 +79,14 @@ class ProductBase(BaseModel):
     slug: str = Field(..., min_length=1, max_length=255)
     description: Optional[str] = None
     price: Decimal = Field(..., gt=0, decimal_places=2)
-    old_price: Optional[Decimal] = Field(None, gt=0, decimal_places=2)
+    old_price: Optional[condecimal(gt=0, decimal_places=2)] = None
     status: ProductStatus = ProductStatus.IN_STOCK
     
     # Характеристики
-    blade_length: Optional[Decimal] = Field(None, gt=0, decimal_places=2)
+    blade_length: Optional[condecimal(gt=0, decimal_places=2)] = None
     blade_material: Optional[str] = Field(None, max_length=100)
     handle_material: Optional[str] = Field(None, max_length=100)
-    weight: Optional[Decimal] = Field(None, gt=0, decimal_places=2)
+    weight: Optional[condecimal(gt=0, decimal_places=2)] = None
     hardness_hrc: Optional[str] = Field(None, max_length=10)
     purpose: Optional[str] = Field(None, max_length=255)
     
@@ -115,8 +115,8 @@ class ProductUpdate(BaseModel):
     name: Optional[str] = Field(None, min_length=1, max_length=255)
     slug: Optional[str] = Field(None, min_length=1, max_length=255)
     description: Optional[str] = None
-    price: Optional[Decimal] = Field(None, gt=0, decimal_places=2)
-    old_price: Optional[Decimal] = Field(None, gt=0, decimal_places=2)
+    price: Optional[condecimal(gt=0, decimal_places=2)] = None
+    old_price: Optional[condecimal(gt=0, decimal_places=2)] = None
     status: Optional[ProductStatus] = None
     
     blade_length: Optional[Decimal] = None
@@ -153,6 +153,11 @@ class ProductResponse(ProductBase):
         from_attributes = True
 
 
+class ProductBatchRequest(BaseModel):
+    """Запрос нескольких товаров по ID"""
+    ids: List[UUID4] = Field(..., min_length=1, max_length=100)
+
+
 class ProductListResponse(BaseModel):
     """Схема списка товаров с пагинацией"""
     items: List[ProductResponse]
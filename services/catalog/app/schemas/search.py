@@ -0,0 +1,13 @@
+"""
+Pydantic схемы поиска
+"""
+from pydantic import BaseModel, UUID4
+from typing import Optional
+
+
+class SuggestionResponse(BaseModel):
+    """Подсказка автодополнения"""
+    text: str
+    kind: str  # product, category, material, purpose
+    id: Optional[UUID4] = None
+    slug: Optional[str] = None
@@ -0,0 +1,33 @@
+"""
+Конфигурация gunicorn для сервиса каталога
+
+Воркеры uvicorn пишут метрики Prometheus в общий каталог
+PROMETHEUS_MULTIPROC_DIR, /metrics любого воркера отдаёт их сумму.
+Переменная задана в Dockerfile и docker-compose.yml; значение по умолчанию
+ниже нужно только для запуска gunicorn вручную.
+"""
+import os
+import shutil
+
+# До импорта prometheus_client: тип хранилища значений выбирается при импорте,
+# и воркеры, созданные fork от мастера, наследуют уже выбранный
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/catalog-metrics")
+
+from prometheus_client import multiprocess  # noqa: E402
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+graceful_timeout = 30
+
+
+def on_starting(server):
+    """Очистить метрики предыдущего запуска"""
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    """Убрать live-gauge завершившегося воркера из суммы"""
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,48 @@
+"""
+Общие фикстуры тестов сервиса каталога
+"""
+from types import SimpleNamespace
+
+
+class FakeResult:
+    """Результат execute() с заранее заданными строками"""
+
+    def __init__(self, rows):
+        self._rows = rows
+
+    def all(self):
+        return list(self._rows)
+
+    def one_or_none(self):
+        return self._rows[0] if self._rows else None
+
+
+class FakeSession:
+    """Сессия, отвечающая на execute() строками по очереди"""
+
+    def __init__(self, *results):
+        self._results = list(results)
+
+    async def execute(self, query):
+        return FakeResult(self._results.pop(0))
+
+
+def row(**fields):
+    """Строка результата запроса с доступом к полям как к атрибутам"""
+    return SimpleNamespace(**fields)
+
+
+class FakeSessionMaker:
+    """Замена async_session_maker: каждая сессия отвечает теми же строками"""
+
+    def __init__(self, *results):
+        self._results = results
+
+    def __call__(self):
+        return self
+
+    async def __aenter__(self):
+        return FakeSession(*self._results)
+
+    async def __aexit__(self, *exc):
+        return False
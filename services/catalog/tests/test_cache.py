@@ -0,0 +1,105 @@
+"""
+Тесты кэша ответов и выбора кодировки сжатия
+"""
+import json
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.core.cache import NegotiatingGZipMiddleware, ResponseCache, brotli, cached_json_response, choose_encoding
+
+AVAILABLE = ("br", "gzip")
+BODY = json.dumps([{"name": "Нож охотничий", "price": "5000.00"}] * 100, ensure_ascii=False).encode()
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, br", "br"),
+    ("br;q=0.1, gzip;q=1", "gzip"),
+    ("gzip;q=0.8, br;q=0.8", "br"),
+    ("BR;Q=0.9, gzip;q=0.3", "br"),
+    ("br;q=0, gzip;q=0", None),
+    ("*", "br"),
+    ("*;q=0.5, br;q=0", "gzip"),
+    ("gzip;q=0.5, identity", None),
+    ("gzip;q=abc, br;q=0.2", "br"),
+    ("deflate", None),
+    ("", None),
+])
+def test_choose_encoding(header, expected):
+    assert choose_encoding(header, AVAILABLE) == expected
+
+
+def test_choose_encoding_only_from_available():
+    assert choose_encoding("br;q=1, gzip;q=0.1", ("gzip",)) == "gzip"
+
+
+def test_response_cache_ttl_and_lru(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("app.core.cache.time.monotonic", lambda: now[0])
+    cache = ResponseCache(ttl=10, max_entries=2)
+    cache.set("a", b"1")
+    cache.set("b", b"2")
+    cache.get("a")
+    cache.set("c", b"3")
+
+    assert cache.get("b") is None
+    assert cache.get("a").raw == b"1"
+    now[0] += 11
+    assert cache.get("a") is None
+
+
+def test_response_cache_invalidate_by_prefix():
+    cache = ResponseCache(ttl=60, max_entries=10)
+    for key in ("product:1", "product:2", "featured:10"):
+        cache.set(key, b"{}")
+    cache.invalidate("product:")
+
+    assert cache.get("product:1") is None
+    assert cache.get("featured:10") is not None
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.add_middleware(NegotiatingGZipMiddleware, minimum_size=100)
+    cache = ResponseCache(ttl=60, max_entries=10)
+
+    @app.get("/cached")
+    async def cached(request: Request):
+        entry = cache.get("body") or cache.set("body", BODY)
+        return cached_json_response(request, entry)
+
+    @app.get("/live")
+    async def live():
+        return json.loads(BODY)
+
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("path", ["/cached", "/live"])
+@pytest.mark.parametrize("header", ["gzip;q=0", "identity;q=1, gzip;q=0.5"])
+def test_refused_gzip_is_not_applied(client, path, header):
+    response = client.get(path, headers={"Accept-Encoding": header})
+    assert "content-encoding" not in response.headers
+    assert response.json() == json.loads(BODY)
+
+
+@pytest.mark.parametrize("path", ["/cached", "/live"])
+def test_gzip_when_accepted(client, path):
+    response = client.get(path, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json() == json.loads(BODY)
+
+
+@pytest.mark.skipif(brotli is None, reason="brotli не установлен")
+def test_cached_prefers_br(client):
+    response = client.get("/cached", headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["content-encoding"] == "br"
+    assert response.content == BODY
+
+
+def test_cached_honors_q_over_br(client):
+    response = client.get("/cached", headers={"Accept-Encoding": "br;q=0.1, gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.content == BODY
@@ -0,0 +1,50 @@
+"""
+Тесты ленты изменений: дедупликация seq и отметка отстающей подписки
+"""
+from app.core.change_feed import RESYNC_EVENT, DeliveredSeqs, Subscription
+
+
+def test_delivered_seqs_skips_duplicates():
+    delivered = DeliveredSeqs(window=10)
+    assert delivered.add(5)
+    assert not delivered.add(5)
+
+
+def test_delivered_seqs_accepts_out_of_order_commit():
+    """seq, зафиксированный позже большего, всё равно доставляется"""
+    delivered = DeliveredSeqs(window=10)
+    assert delivered.add(7)
+    assert delivered.add(6)
+    assert delivered.high == 7
+
+
+def test_replay_from_looks_back_by_window():
+    assert DeliveredSeqs(window=100).replay_from() is None
+    assert DeliveredSeqs(window=100, resume_seq=1000).replay_from() == 900
+    assert DeliveredSeqs(window=100, resume_seq=30).replay_from() == 0
+
+
+def test_delivered_seqs_forgets_below_window():
+    delivered = DeliveredSeqs(window=2)
+    for seq in range(1, 7):
+        delivered.add(seq)
+    # 1 ушёл за окно и был забыт, 6 ещё помнится
+    assert delivered.add(1)
+    assert not delivered.add(6)
+
+
+def test_mark_lagging_wakes_reader():
+    subscription = Subscription(maxsize=2)
+    subscription.mark_lagging()
+    assert subscription.lagging
+    assert subscription.queue.get_nowait() is RESYNC_EVENT
+
+
+def test_mark_lagging_with_full_queue():
+    subscription = Subscription(maxsize=1)
+    subscription.queue.put_nowait({"seq": 1})
+    subscription.mark_lagging()
+    assert subscription.lagging
+    subscription.reset()
+    assert not subscription.lagging
+    assert subscription.queue.empty()
@@ -0,0 +1,73 @@
+"""
+Тесты статистики фильтров каталога
+"""
+import asyncio
+from decimal import Decimal
+from types import SimpleNamespace
+
+from app.core import filter_stats
+from app.core.filter_stats import FilterUsageSampler, filter_shape
+from app.crud.product import ProductCRUD
+from app.db.models import ProductStatus
+from app.schemas.product import ProductFilter
+
+
+def test_filter_shape():
+    filters = ProductFilter(
+        min_price=Decimal("1000"), status=ProductStatus.IN_STOCK, is_featured=True,
+        search="охота", sort_by="price", sort_order="asc",
+    )
+    assert filter_shape(filters) == "min_price,status=in_stock,is_featured=true,search|sort=price:asc"
+    assert filter_shape(ProductFilter(blade_material="")) == "|sort=created_at:desc"
+
+
+def test_filter_shape_ignores_values_of_range_filters():
+    assert filter_shape(ProductFilter(min_price=Decimal("10"))) == filter_shape(ProductFilter(min_price=Decimal("99")))
+
+
+def test_space_saving_keeps_frequent_shapes():
+    sampler = FilterUsageSampler(capacity=2, sample_rate=1.0, flush_interval=60)
+    frequent = ProductFilter(is_new=True)
+    for _ in range(5):
+        sampler.record(frequent, 0.01)
+    sampler.record(ProductFilter(status=ProductStatus.ON_ORDER), 0.01)
+    sampler.record(ProductFilter(is_featured=True), 0.02)
+
+    counters = sampler._counters
+    assert len(counters) == 2
+    assert counters[filter_shape(frequent)].count == 5
+    # Новая форма вытеснила самую редкую и унаследовала её счёт как погрешность
+    newcomer = counters[filter_shape(ProductFilter(is_featured=True))]
+    assert (newcomer.count, newcomer.error, newcomer.samples) == (2, 1, 1)
+    assert newcomer.example == {"is_featured": True}
+
+
+def test_sample_rate_skips_requests(monkeypatch):
+    sampler = FilterUsageSampler(capacity=10, sample_rate=0.5, flush_interval=60)
+    monkeypatch.setattr(filter_stats.random, "random", lambda: 0.9)
+    sampler.record(ProductFilter(), 0.01)
+    assert not sampler._counters
+
+
+class ListResult:
+    def scalar(self):
+        return 0
+
+    def scalars(self):
+        return SimpleNamespace(all=lambda: [])
+
+
+class ListSession:
+    async def execute(self, query):
+        return ListResult()
+
+
+def test_internal_get_list_is_not_recorded(monkeypatch):
+    sampler = FilterUsageSampler(capacity=10, sample_rate=1.0, flush_interval=60)
+    monkeypatch.setattr("app.crud.product.filter_usage", sampler)
+
+    asyncio.run(ProductCRUD.get_list(ListSession(), ProductFilter(), record_usage=False))
+    assert not sampler._counters
+
+    asyncio.run(ProductCRUD.get_list(ListSession(), ProductFilter()))
+    assert sampler._counters[filter_shape(ProductFilter())].count == 1
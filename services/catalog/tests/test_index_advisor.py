@@ -0,0 +1,111 @@
+"""
+Тесты подбора индексов по статистике фильтров
+"""
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.core.index_advisor import (
+    IndexCandidate,
+    candidates_for,
+    find_existing,
+    parse_shape,
+    predicate_conjuncts,
+)
+
+connection = SimpleNamespace(dialect=postgresql.asyncpg.dialect())
+
+# Определения в том виде, в каком их отдаёт pg_indexes
+HOT = "WHERE (status <> 'discontinued'::product_status)"
+INDEXES = [
+    ("products_pkey", "CREATE UNIQUE INDEX products_pkey ON public.products USING btree (id)"),
+    ("idx_products_status", "CREATE INDEX idx_products_status ON public.products USING btree (status)"),
+    ("idx_products_name_trgm", "CREATE INDEX idx_products_name_trgm ON public.products USING gin (name gin_trgm_ops)"),
+    ("idx_products_hot_price", f"CREATE INDEX idx_products_hot_price ON public.products USING btree (price) {HOT}"),
+    (
+        "idx_products_hot_category_created_at",
+        "CREATE INDEX idx_products_hot_category_created_at ON public.products "
+        f"USING btree (category_id, created_at DESC) {HOT}",
+    ),
+    (
+        "idx_products_hot_featured",
+        "CREATE INDEX idx_products_hot_featured ON public.products USING btree (id) "
+        "WHERE (is_featured AND (status <> 'discontinued'::product_status))",
+    ),
+    (
+        "idx_products_hot_new",
+        "CREATE INDEX idx_products_hot_new ON public.products USING btree (created_at DESC) "
+        "WHERE (is_new AND (status <> 'discontinued'::product_status))",
+    ),
+]
+
+
+def primary(shape: str) -> IndexCandidate:
+    return candidates_for(shape, connection)[0]
+
+
+def test_parse_shape():
+    assert parse_shape("category_id,status=in_stock|sort=price:asc") == (
+        {"category_id": None, "status": "in_stock"}, "price", "asc",
+    )
+    assert parse_shape("|sort=") == ({}, "created_at", "desc")
+
+
+def test_candidates():
+    candidates = candidates_for("category_id,min_price,max_price,search|sort=created_at:desc", connection)
+    assert candidates[0].columns == ("category_id", "price")
+    assert candidates[0].predicate == "status != 'discontinued'"
+    assert [item.columns for item in candidates[1:]] == [("description",), ("blade_material",), ("purpose",)]
+    assert all(item.method == "gin" for item in candidates[1:])
+
+
+def test_candidate_ddl():
+    candidate = primary("category_id,is_new=true|sort=price:asc")
+    assert candidate.name.startswith("idx_products_category_id_price_status_not_discontinued")
+    assert len(candidate.name) == 63
+    assert candidate.ddl(concurrently=True) == (
+        f"CREATE INDEX CONCURRENTLY {candidate.name} ON products USING btree (category_id, price) "
+        "WHERE status != 'discontinued' AND is_new = true"
+    )
+
+
+@pytest.mark.parametrize("left, right", [
+    ("status != 'discontinued' AND is_featured = true",
+     "(is_featured AND (status <> 'discontinued'::product_status))"),
+    ("is_new = false", "(NOT is_new)"),
+    ("(blade_material)::text <> 'x'::text", "blade_material <> 'x'"),
+])
+def test_predicate_conjuncts_normalize(left, right):
+    assert predicate_conjuncts(left) == predicate_conjuncts(right)
+
+
+def test_predicate_conjuncts_keep_operator():
+    assert predicate_conjuncts("status = 'discontinued'") != predicate_conjuncts(HOT[6:])
+    assert predicate_conjuncts(None) == frozenset()
+
+
+@pytest.mark.parametrize("shape, expected", [
+    # Обратное условие: индекс по горячим товарам не содержит снятых с производства
+    ("min_price,status=discontinued|sort=price:asc", None),
+    ("min_price|sort=price:asc", "idx_products_hot_price"),
+    ("category_id|sort=created_at:desc", "idx_products_hot_category_created_at"),
+    ("is_featured=true|sort=created_at:desc", "idx_products_hot_featured"),
+    ("is_new=true|sort=created_at:desc", "idx_products_hot_new"),
+    # Горячий индекс годится и для более узкого запроса
+    ("min_price,is_new=true|sort=price:asc", "idx_products_hot_price"),
+    ("hardness_hrc|sort=created_at:desc", None),
+    ("status=in_stock|sort=price:asc", None),
+])
+def test_find_existing(shape, expected):
+    assert find_existing(primary(shape), INDEXES) == expected
+
+
+def test_find_existing_gin():
+    assert find_existing(IndexCandidate(("name",), method="gin"), INDEXES) == "idx_products_name_trgm"
+    assert find_existing(IndexCandidate(("purpose",), method="gin"), INDEXES) is None
+
+
+def test_full_index_covers_partial_candidate():
+    candidate = IndexCandidate(("status",), predicate="status = 'in_stock'")
+    assert find_existing(candidate, INDEXES) == "idx_products_status"
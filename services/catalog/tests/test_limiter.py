@@ -0,0 +1,107 @@
+"""
+Тесты адаптивного ограничителя параллельности
+"""
+import asyncio
+
+import pytest
+
+from app.core.limiter import AdaptiveLimiter, Priority, classify
+
+
+def make_limiter(limit=1, max_queue=10, **overrides) -> AdaptiveLimiter:
+    params = dict(
+        initial_limit=limit, min_limit=1, max_limit=10,
+        latency_target=0.25, backoff=0.5, max_queue=max_queue,
+    )
+    params.update(overrides)
+    return AdaptiveLimiter(**params)
+
+
+def scope(method, path, user_agent=b"Mozilla/5.0"):
+    return {"method": method, "path": path, "headers": [(b"user-agent", user_agent)]}
+
+
+@pytest.mark.parametrize("method, path, expected", [
+    ("POST", "/api/v1/products/validate-cart", Priority.CRITICAL),
+    ("GET", "/api/v1/products/3fa85f64-5717-4562-b3fc-2c963f66afa6", Priority.CRITICAL),
+    ("GET", "/api/v1/products/slug/nozh", Priority.HIGH),
+    ("GET", "/api/v1/categories/", Priority.HIGH),
+    ("GET", "/api/v1/products", Priority.NORMAL),
+    ("GET", "/health/ready", None),
+    ("GET", "/api/v1/changes/stream", None),
+])
+def test_classify(method, path, expected):
+    assert classify(scope(method, path)) == expected
+
+
+def test_crawlers_get_low_priority():
+    assert classify(scope("GET", "/api/v1/products/slug/nozh", b"Googlebot/2.1")) == Priority.LOW
+
+
+def test_admits_waiters_by_priority():
+    async def run():
+        limiter = make_limiter(limit=1)
+        assert await limiter.acquire(Priority.NORMAL)
+        order = []
+
+        async def wait(priority):
+            if await limiter.acquire(priority):
+                order.append(priority)
+                limiter.release(0.0)
+
+        tasks = [asyncio.create_task(wait(priority)) for priority in (Priority.NORMAL, Priority.CRITICAL)]
+        await asyncio.sleep(0)
+        assert limiter.queue_depth == 2
+        limiter.release(0.0)
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(run()) == [Priority.CRITICAL, Priority.NORMAL]
+
+
+def test_full_queue_evicts_lower_priority():
+    async def run():
+        limiter = make_limiter(limit=1, max_queue=1)
+        assert await limiter.acquire(Priority.NORMAL)
+        low = asyncio.create_task(limiter.acquire(Priority.LOW))
+        await asyncio.sleep(0)
+
+        high = asyncio.create_task(limiter.acquire(Priority.HIGH))
+        await asyncio.sleep(0)
+        assert await low is False
+
+        # Очередь снова полна, а вытеснять некого
+        assert await limiter.acquire(Priority.LOW) is False
+
+        limiter.release(0.0)
+        return await high
+
+    assert asyncio.run(run()) is True
+
+
+def test_deadline_sheds_waiter():
+    async def run():
+        limiter = make_limiter(limit=1)
+        assert await limiter.acquire(Priority.NORMAL)
+        return await limiter.acquire(Priority.LOW), limiter.queue_depth
+
+    assert asyncio.run(run()) == (False, 0)
+
+
+def test_aimd_limit():
+    limiter = make_limiter(limit=4)
+    limiter.inflight = 2
+    limiter.release(0.01)
+    assert limiter.limit == pytest.approx(4.25)
+
+    limiter.release(1.0)
+    assert limiter.limit == pytest.approx(2.125)
+    assert limiter.inflight == 0
+
+
+def test_limit_decreases_once_per_interval():
+    limiter = make_limiter(limit=8)
+    limiter.inflight = 2
+    limiter.release(1.0)
+    limiter.release(1.0)
+    assert limiter.limit == pytest.approx(4.0)
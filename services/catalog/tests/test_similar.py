@@ -0,0 +1,71 @@
+"""
+Тесты индекса похожих товаров
+"""
+import asyncio
+from decimal import Decimal
+from uuid import uuid4
+
+from app.db.models import ProductStatus
+from app.indexes.similar import SimilarProductsIndex
+from tests.conftest import FakeSession, row
+
+
+def product(purpose, price, status=ProductStatus.IN_STOCK, **fields):
+    values = dict(
+        id=uuid4(), status=status, category_id=None, price=Decimal(price),
+        blade_length=None, weight=None, blade_material=None, purpose=purpose,
+    )
+    values.update(fields)
+    return row(**values)
+
+
+def build(rows) -> SimilarProductsIndex:
+    index = SimilarProductsIndex()
+    asyncio.run(index.rebuild(FakeSession(rows)))
+    return index
+
+
+def test_not_built_until_rebuild():
+    index = SimilarProductsIndex()
+    assert not index.is_built
+    assert build([]).is_built
+
+
+def test_nearest_by_purpose_and_price():
+    hunting = product("охота", "5000")
+    hunting_close = product("охота", "5500")
+    hunting_far = product("охота", "50000")
+    kitchen = product("кухня", "5000")
+    index = build([hunting, hunting_close, hunting_far, kitchen])
+
+    assert index.similar(hunting.id, 3) == [hunting_close.id, hunting_far.id, kitchen.id]
+
+
+def test_skips_discontinued_and_self():
+    base = product("охота", "5000")
+    gone = product("охота", "5000", status=ProductStatus.DISCONTINUED)
+    other = product("кухня", "9000")
+    index = build([base, gone, other])
+
+    assert index.similar(base.id, 5) == [other.id]
+    assert index.similar(uuid4(), 5) == []
+
+
+def test_refresh_adds_new_product():
+    base = product("охота", "5000")
+    index = build([base])
+    added = product("охота", "5100")
+
+    asyncio.run(index.refresh_product(FakeSession([added]), added.id))
+
+    assert added.id in index
+    assert index.similar(base.id, 1) == [added.id]
+
+
+def test_refresh_removed_product_deactivates_it():
+    base, other = product("охота", "5000"), product("охота", "5100")
+    index = build([base, other])
+
+    asyncio.run(index.refresh_product(FakeSession([]), other.id))
+
+    assert index.similar(base.id, 5) == []
@@ -0,0 +1,56 @@
+"""
+Тесты записи медленных запросов
+"""
+from types import SimpleNamespace
+
+from app.core.slow_queries import SlowQueryRecorder, current_filters, normalize_sql, query_filters
+
+
+def test_normalize_sql():
+    statement = "SELECT *\n  FROM products WHERE id IN ($1::UUID, $2::UUID, $3::UUID) AND price > $4"
+    assert normalize_sql(statement) == "SELECT * FROM products WHERE id IN (...) AND price > $?"
+
+
+def test_query_filters_are_reset_after_block():
+    with query_filters({"status": "in_stock"}):
+        assert current_filters.get() == {"status": "in_stock"}
+        with query_filters({"is_new": True}):
+            assert current_filters.get() == {"is_new": True}
+        assert current_filters.get() == {"status": "in_stock"}
+    assert current_filters.get() is None
+
+
+def execute(recorder, statement, executemany=False):
+    conn = SimpleNamespace(info={})
+    recorder._before_execute(conn, None, statement, (), None, executemany)
+    recorder._after_execute(conn, None, statement, (), None, executemany)
+
+
+def test_records_slow_query_with_filters():
+    recorder = SlowQueryRecorder(threshold_ms=0, capacity=10, sample_rate=0.0)
+    with query_filters({"category_id": "knives"}):
+        execute(recorder, "SELECT * FROM products WHERE slug = $1")
+    execute(recorder, "SELECT 1")
+
+    first, second = recorder._publish_queue.get_nowait(), recorder._publish_queue.get_nowait()
+    assert first["sql"] == "SELECT * FROM products WHERE slug = $?"
+    assert first["filters"] == {"category_id": "knives"}
+    assert second["filters"] is None
+
+
+def test_fast_query_is_not_recorded():
+    recorder = SlowQueryRecorder(threshold_ms=60_000, capacity=10, sample_rate=1.0)
+    execute(recorder, "SELECT 1")
+    assert recorder._publish_queue.empty()
+    assert recorder._explain_queue.empty()
+
+
+def test_sampled_select_waits_for_plan():
+    recorder = SlowQueryRecorder(threshold_ms=0, capacity=10, sample_rate=1.0)
+    execute(recorder, "SELECT 1")
+    execute(recorder, "UPDATE products SET view_count = view_count + 1")
+
+    record, statement, _ = recorder._explain_queue.get_nowait()
+    assert statement == "SELECT 1"
+    assert recorder._publish_queue.get_nowait()["sql"].startswith("UPDATE")
+    assert recorder._publish_queue.empty()
@@ -0,0 +1,108 @@
+"""
+Тесты карты slug
+"""
+import asyncio
+from uuid import uuid4
+
+from app.indexes import slugs as slugs_module
+from app.indexes.slugs import SlugIndex, SlugMap
+from tests.conftest import FakeSessionMaker, row
+
+
+def test_load_resolve_and_redirect():
+    product_id = uuid4()
+    slugs = SlugMap()
+    slugs.load([(product_id, "nozh-novyi")], [("nozh-staryi", product_id)])
+
+    assert slugs.resolve("nozh-novyi") == product_id
+    assert slugs.resolve("nozh-staryi") is None
+    assert slugs.redirect("nozh-staryi") == "nozh-novyi"
+    assert slugs.redirect("unknown") is None
+
+
+def test_load_ignores_history_of_live_slugs():
+    first, second = uuid4(), uuid4()
+    slugs = SlugMap()
+    slugs.load([(first, "a"), (second, "b")], [("b", first)])
+    assert slugs.resolve("b") == second
+    assert slugs.redirect("b") is None
+
+
+def test_rename_moves_previous_slug_to_history():
+    product_id = uuid4()
+    slugs = SlugMap()
+    slugs.set(product_id, "x")
+    slugs.set(product_id, "y")
+
+    assert slugs.resolve("x") is None
+    assert slugs.redirect("x") == "y"
+    assert len(slugs) == 1
+
+
+def test_reused_slug_leaves_history():
+    renamed, newcomer = uuid4(), uuid4()
+    slugs = SlugMap()
+    slugs.set(renamed, "x")
+    slugs.set(renamed, "y")
+    slugs.set(newcomer, "x")
+
+    assert slugs.resolve("x") == newcomer
+    assert slugs.redirect("x") is None
+
+
+def test_out_of_order_events_keep_slug_with_new_owner():
+    """Создание B со slug x пришло раньше переименования A из x в y"""
+    renamed, newcomer = uuid4(), uuid4()
+    slugs = SlugMap()
+    slugs.set(renamed, "x")
+    slugs.set(newcomer, "x")
+    slugs.set(renamed, "y")
+
+    assert slugs.resolve("x") == newcomer
+    assert slugs.resolve("y") == renamed
+    assert slugs.redirect("x") is None
+
+
+def test_remove_drops_history_but_not_reused_slug():
+    removed, newcomer = uuid4(), uuid4()
+    slugs = SlugMap()
+    slugs.set(removed, "old")
+    slugs.set(removed, "x")
+    slugs.set(newcomer, "x")
+    slugs.remove(removed)
+
+    assert slugs.resolve("x") == newcomer
+    assert slugs.redirect("old") is None
+
+
+def test_apply_events():
+    index = SlugIndex()
+    product_id, category_id = uuid4(), uuid4()
+    index.apply({"entity": "product", "op": "insert", "id": str(product_id), "data": {"slug": "nozh"}})
+    index.apply({"entity": "category", "op": "insert", "id": str(category_id), "data": {"slug": "nozhi"}})
+
+    assert index.products.resolve("nozh") == product_id
+    assert index.categories.resolve("nozhi") == category_id
+    assert index.products.resolve("nozhi") is None
+
+    index.apply({"entity": "product", "op": "delete", "id": str(product_id), "data": {"slug": "nozh"}})
+    assert index.products.resolve("nozh") is None
+
+
+def test_resync_rebuilds_from_database(monkeypatch):
+    product_id = uuid4()
+    history = [row(entity="product", slug="staryi", entity_id=product_id)]
+    monkeypatch.setattr(
+        slugs_module, "async_session_maker",
+        FakeSessionMaker(history, [(product_id, "novyi")], []),
+    )
+    index = SlugIndex()
+    monkeypatch.setattr(slugs_module, "slug_index", index)
+
+    async def run():
+        await slugs_module.apply_change({"seq": None, "entity": "resync", "op": "resync"})
+        await index._rebuild_task
+
+    asyncio.run(run())
+    assert index.products.resolve("novyi") == product_id
+    assert index.products.redirect("staryi") == "novyi"
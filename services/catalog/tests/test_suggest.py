@@ -0,0 +1,92 @@
+"""
+Тесты индекса автодополнения
+"""
+import asyncio
+from uuid import uuid4
+
+import pytest
+
+from app.core.config import settings
+from app.indexes import suggest as suggest_module
+from app.indexes.suggest import SuggestIndex, normalize
+from tests.conftest import FakeSession, FakeSessionMaker, row
+
+
+def product(name, view_count=0, blade_material=None, purpose=None):
+    return row(
+        id=uuid4(), name=name, slug=name, blade_material=blade_material,
+        purpose=purpose, view_count=view_count,
+    )
+
+
+def build(products, categories=()) -> SuggestIndex:
+    index = SuggestIndex()
+    asyncio.run(index.rebuild(FakeSession(products, list(categories))))
+    return index
+
+
+def texts(suggestions):
+    return [suggestion["text"] for suggestion in suggestions]
+
+
+def test_normalize():
+    assert normalize("  Ёлка,  ЛЕС! ") == "елка лес"
+    assert normalize("--") == ""
+
+
+def test_prefix_and_word_matches():
+    index = build([product("Нож охотничий"), product("Охотничий топор"), product("Кухонный нож")])
+
+    assert texts(index.suggest("охот")) == ["Охотничий топор", "Нож охотничий"]
+    assert set(texts(index.suggest("нож"))) == {"Нож охотничий", "Кухонный нож"}
+    assert index.suggest("   ") == []
+
+
+def test_yo_is_folded():
+    index = build([product("Ёрш")])
+    assert texts(index.suggest("ерш")) == ["Ёрш"]
+
+
+def test_category_and_material_rank_above_products():
+    index = build(
+        [product("Складной нож", blade_material="Сталь D2"), product("Сталь дамасская нож")],
+        [row(id=uuid4(), name="Складные ножи", slug="folding")],
+    )
+
+    assert texts(index.suggest("скла")) == ["Складные ножи", "Складной нож"]
+    assert texts(index.suggest("стал"))[0] == "Сталь D2"
+
+
+@pytest.mark.parametrize("prefix", ["н", "но", "нож"])
+def test_short_prefixes_rank_like_bisect(prefix):
+    index = build([product("Нож"), product("Ножны", view_count=500), product("Ножницы", view_count=50)])
+    precomputed = index.suggest(prefix)
+
+    index._short = {}
+    assert precomputed == index.suggest(prefix)
+
+
+def test_exact_match_wins_over_continuation():
+    index = build([product("Нож"), product("Ножны", view_count=500)])
+    assert texts(index.suggest("нож"))[0] == "Нож"
+
+
+def test_rebuild_reruns_for_changes_during_rebuild(monkeypatch):
+    index = SuggestIndex()
+    calls = []
+
+    async def rebuild(db):
+        calls.append(db)
+        if len(calls) == 1:
+            index.schedule_rebuild()
+
+    monkeypatch.setattr(index, "rebuild", rebuild)
+    monkeypatch.setattr(settings, "SUGGEST_REBUILD_DELAY_SECONDS", 0)
+    monkeypatch.setattr(suggest_module, "async_session_maker", FakeSessionMaker())
+
+    async def run():
+        index.schedule_rebuild()
+        await index._rebuild_task
+
+    asyncio.run(run())
+    assert len(calls) == 2